@@ -0,0 +1,247 @@
+import os
+import csv
+import json
+import argparse
+import numpy as np
+from colorama import Fore
+from typing import Any
+
+from logger import ColorLogger
+from config import AnalyzeConfig
+from results import ResultLog, STATUS_NAMES
+from stats import LatencyHistogram
+
+# Get logging
+logger = ColorLogger("gRPC Analyze")
+
+# ResultLog.RECORD_FORMAT as a NumPy record, so files can be memory mapped as arrays
+RECORD_DTYPE = np.dtype([("sent_ns", "<i8"), ("latency_us", "<u4"), ("bytes_sent", "<u4"), ("bytes_received", "<u4"),
+                         ("target", "<u2"), ("backend", "<u2"), ("code", "u1"), ("pad", "V3")])
+assert RECORD_DTYPE.itemsize == ResultLog.RECORD.size
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# The histograms are LatencyHistogram's log-linear buckets.  The run and per-backend totals keep its
+# precision, each row of the time series uses fewer sub-buckets (~3%) to keep long runs in memory.
+FULL_BITS = LatencyHistogram.SUB_BUCKET_BITS
+SERIES_BITS = 5
+STATUS_COUNT = len(STATUS_NAMES)
+
+
+def bucket_count(bits:int) -> int:
+    return (1 << bits) + LatencyHistogram.MAX_SHIFT * (1 << (bits - 1))
+
+
+def bucket_index(us:np.ndarray, bits:int) -> np.ndarray:
+    # LatencyHistogram.bucket_index over an array, the frexp exponent of a value is its bit length
+    sub, half = 1 << bits, 1 << (bits - 1)
+    us = us.astype(np.int64)
+    shift = np.clip(np.frexp(us)[1] - bits, 1, LatencyHistogram.MAX_SHIFT)
+    index = np.where(us < sub, us, sub + (shift - 1) * half + (us >> shift) - half)
+    return np.minimum(index, bucket_count(bits) - 1)
+
+
+def bucket_upper(index:np.ndarray, bits:int) -> np.ndarray:
+    sub, half = 1 << bits, 1 << (bits - 1)
+    shift, top = np.divmod(index - sub, half)
+    return np.where(index < sub, index, ((top + half + 1) << (shift + 1)) - 1)
+
+
+def percentiles(counts:np.ndarray, bits:int) -> np.ndarray:
+    """
+    Percentiles in us for each row of bucket counts, one column per PERCENTILES entry.
+    """
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1]
+    result = np.zeros((len(counts), len(PERCENTILES)), dtype=np.int64)
+    for j, pct in enumerate(PERCENTILES):
+        rank = np.maximum(np.ceil(pct / 100.0 * total), 1)
+        index = np.minimum((cumulative < rank[:, None]).sum(axis=1), counts.shape[1] - 1)
+        result[:, j] = bucket_upper(index, bits)
+    result[total == 0] = 0
+    return result
+
+
+class RecordFile:
+    """
+    One recorded file, memory mapped, with its header and send times shifted onto the shared timeline.
+    """
+    def __init__(self, path:str, targets:dict[str, int], backends:dict[str, int]):
+        with open(path + ".json") as f:
+            self.header = json.load(f)
+        if self.header.get("format") != ResultLog.RECORD_FORMAT:
+            raise ValueError(f"{path} was written with record format {self.header.get('format')}, expected {ResultLog.RECORD_FORMAT}")
+
+        # A run that was killed can leave a partial record at the end, it is ignored
+        count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,)) if count else np.empty(0, RECORD_DTYPE)
+        self.start_epoch = self.header["start_epoch"]
+        self.offset_ns = 0
+
+        # Map this file's ids to ids shared by every file
+        self.targets = np.array([targets.setdefault(name, len(targets)) for name in self.header["targets"]], dtype=np.int64)
+        self.backends = np.array([backends.setdefault(name, len(backends)) for name in self.header["backends"]], dtype=np.int64)
+
+    def chunks(self, size:int):
+        for i in range(0, len(self.records), size):
+            yield self.records[i:i + size]
+
+
+class Analysis:
+    """
+    Vectorized passes over every record, a chunk at a time so memory depends on the run's length and
+    backends rather than on the number of records.
+    """
+    def __init__(self, files:list[RecordFile], targets:dict[str, int], backends:dict[str, int], interval:float, chunk:int):
+        self.files = files
+        self.target_names = sorted(targets, key=targets.get)
+        self.backend_names = sorted(backends, key=backends.get)
+        self.interval_ns = int(interval * 1e9)
+        self.chunk = chunk
+
+        # Every file's send times count from the earliest start
+        first = min(f.start_epoch for f in files)
+        for f in files:
+            f.offset_ns = int((f.start_epoch - first) * 1e9)
+
+        end = max((int(c["sent_ns"].max()) + f.offset_ns for f in files for c in f.chunks(chunk) if len(c)), default=0)
+        self.rows = max(end, 0) // self.interval_ns + 1
+
+        full, series = bucket_count(FULL_BITS), bucket_count(SERIES_BITS)
+        self.rpcs = np.zeros(self.rows, dtype=np.int64)
+        self.errors = np.zeros(self.rows, dtype=np.int64)
+        self.bytes = np.zeros(self.rows, dtype=np.float64)
+        self.codes = np.zeros((self.rows, STATUS_COUNT), dtype=np.int64)
+        self.series = np.zeros((self.rows, series), dtype=np.int64)
+        self.by_target = np.zeros((len(targets), full), dtype=np.int64)
+        self.target_errors = np.zeros(len(targets), dtype=np.int64)
+        self.by_backend = np.zeros((len(backends), full), dtype=np.int64)
+        self.max_us = 0
+
+    def run(self):
+        for f in self.files:
+            for chunk in f.chunks(self.chunk):
+                self._add(f, chunk)
+
+    def _add(self, f:RecordFile, chunk:np.ndarray):
+        rows, full, series = self.rows, bucket_count(FULL_BITS), bucket_count(SERIES_BITS)
+        row = np.clip((chunk["sent_ns"] + f.offset_ns) // self.interval_ns, 0, rows - 1)
+        code = np.minimum(chunk["code"], STATUS_COUNT - 1).astype(np.int64)
+        target = f.targets[chunk["target"]]
+        ok = code == 0
+
+        self.rpcs += np.bincount(row, minlength=rows)
+        self.bytes += np.bincount(row, weights=chunk["bytes_sent"].astype(np.float64) + chunk["bytes_received"], minlength=rows)
+        self.errors += np.bincount(row[~ok], minlength=rows)
+        self.codes += np.bincount(row[~ok] * STATUS_COUNT + code[~ok], minlength=rows * STATUS_COUNT).reshape(rows, STATUS_COUNT)
+        self.target_errors += np.bincount(target[~ok], minlength=len(self.target_errors))
+
+        # Latency only counts for rpcs that succeeded
+        latency = chunk["latency_us"][ok]
+        if len(latency) == 0:
+            return
+        self.max_us = max(self.max_us, int(latency.max()))
+        row, target, backend = row[ok], target[ok], f.backends[chunk["backend"][ok]]
+        index = bucket_index(latency, FULL_BITS)
+
+        self.series += np.bincount(row * series + bucket_index(latency, SERIES_BITS), minlength=rows * series).reshape(rows, series)
+        self.by_target += np.bincount(target * full + index, minlength=self.by_target.size).reshape(self.by_target.shape)
+        self.by_backend += np.bincount(backend * full + index, minlength=self.by_backend.size).reshape(self.by_backend.shape)
+
+    def bursts(self) -> list[tuple[int, int, int, int, np.ndarray]]:
+        """
+        Runs of consecutive intervals with errors as (first row, rows, errors, rpcs, error codes), most errors first.
+        """
+        edges = np.diff(np.concatenate(([0], (self.errors > 0).astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        bursts = [(s, e - s, int(self.errors[s:e].sum()), int(self.rpcs[s:e].sum()), self.codes[s:e].sum(axis=0))
+                  for s, e in zip(starts, ends)]
+        return sorted(bursts, key=lambda b: -b[2])
+
+
+def ms(us:Any) -> str:
+    return f"{us / 1000:.2f}"
+
+
+def report_split(title:str, names:list[str], counts:np.ndarray, errors:np.ndarray = None):
+    total = counts.sum()
+    if total == 0:
+        return
+
+    logger.log(f"{title}:", color=Fore.CYAN)
+    pcts = percentiles(counts, FULL_BITS)
+    for i, name in enumerate(names):
+        n, failed = counts[i].sum(), int(errors[i]) if errors is not None else 0
+        if n == 0 and failed == 0:
+            continue
+        suffix = f", {failed} errors" if errors is not None else ""
+        logger.log(f"  {name or 'unknown'}: {n} ok ({100.0 * n / total:.1f}%){suffix}  "
+                   + " ".join(f"p{p:g}={ms(v)}ms" for p, v in zip(PERCENTILES, pcts[i])), color=Fore.CYAN)
+
+
+def write_series(analysis:Analysis, path:str = None):
+    seconds = analysis.interval_ns / 1e9
+    pcts = percentiles(analysis.series, SERIES_BITS)
+    header = ["time_s", "rpc_per_s", "errors", "mb_per_s"] + [f"p{p:g}_ms" for p in PERCENTILES]
+    rows = ([f"{i * seconds:.3f}", f"{analysis.rpcs[i] / seconds:.1f}", int(analysis.errors[i]),
+             f"{analysis.bytes[i] / seconds / 1e6:.3f}"] + [ms(v) for v in pcts[i]] for i in range(analysis.rows))
+
+    if path:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        logger.info(f"Time series written to {path}")
+        return
+
+    logger.log("Time series:", color=Fore.CYAN)
+    logger.log("  " + " ".join(f"{h:>10}" for h in header), color=Fore.CYAN)
+    for i, row in enumerate(rows):
+        logger.log("  " + " ".join(f"{v:>10}" for v in row), color=Fore.YELLOW if analysis.errors[i] else Fore.WHITE)
+
+
+def main():
+    ac = AnalyzeConfig( argparse.ArgumentParser(description="Summarise gRPC client result records"), logger )
+    args = ac.get_args()
+
+    targets:dict[str, int] = {}
+    backends:dict[str, int] = {}
+    try:
+        files = [RecordFile(path, targets, backends) for path in args.files]
+    except (ValueError, KeyError, json.JSONDecodeError) as e:
+        logger.error(f"Could not read the recorded files: {e}")
+        exit(1)
+
+    analysis = Analysis(files, targets, backends, args.interval, args.chunk)
+    analysis.run()
+
+    count, errors = int(analysis.rpcs.sum()), int(analysis.errors.sum())
+    if count == 0:
+        logger.warning("No rpcs were recorded")
+        return
+
+    span = analysis.rows * analysis.interval_ns / 1e9
+    overall = np.minimum(percentiles(analysis.by_backend.sum(axis=0, keepdims=True), FULL_BITS)[0], analysis.max_us)
+    logger.log(f"{count} rpcs in {len(files)} files over {span:.0f}s: {count / span:.1f} rpc/s, {errors} errors "
+               f"({100.0 * errors / count:.3f}%), {analysis.bytes.sum() / 1e6:.1f} MB of payload", color=Fore.GREEN)
+    logger.log("  overall: " + " ".join(f"p{p:g}={ms(v)}ms" for p, v in zip(PERCENTILES, overall))
+               + f" max={ms(analysis.max_us)}ms", color=Fore.GREEN)
+
+    write_series(analysis, args.csv)
+    report_split("By target", analysis.target_names, analysis.by_target, analysis.target_errors)
+    report_split("By backend", analysis.backend_names, analysis.by_backend)
+
+    if errors:
+        codes = analysis.codes.sum(axis=0)
+        logger.warning("Errors by status: " + ", ".join(f"{STATUS_NAMES.get(c, c)}={n}" for c, n in enumerate(codes) if n))
+
+        bursts = analysis.bursts()
+        seconds = analysis.interval_ns / 1e9
+        logger.warning(f"{len(bursts)} error bursts, largest first:")
+        for first, rows, failed, rpcs, burst_codes in bursts[:args.bursts]:
+            names = ", ".join(f"{STATUS_NAMES.get(c, c)}={n}" for c, n in enumerate(burst_codes) if n)
+            logger.warning(f"  at {first * seconds:.1f}s for {rows * seconds:.1f}s: {failed} of {rpcs} rpcs failed ({names})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import platform
+import subprocess
+import grpc
+from colorama import Fore
+from typing import Any, Optional
+
+from logger import ColorLogger
+from config import BenchmarkConfig
+from client import make_channel, BidirectionalClient, CLIENT_TYPES
+from pool import ChannelPool
+from loadgen import LoadGenerator
+from streambench import StreamBenchmark
+from stats import RunRecorder
+from payload import message_limit, message_size_options
+
+# Get logging
+logger = ColorLogger("gRPC Benchmark")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Metrics compared against the baseline and whether a higher value is better
+COMPARED_METRICS = {"throughput": True, "p50_ms": False, "p99_ms": False}
+
+
+class BenchmarkServer:
+    """
+    server.py in a subprocess on loopback, for one group of cases.  Request logging is off so the
+    console isn't what gets measured.  Anything in `extra` is passed on to server.py as it is.
+    """
+    def __init__(self, port:int, type:str, secure:bool, engine:str, workers:int, max_message_size:int, extra:list[str] = ()):
+        self.port = port
+        self.command = [sys.executable, os.path.join(HERE, "server.py"), "--ip", "127.0.0.1", "--port", str(port),
+                        "--type", type, "--engine", engine, "--workers", str(workers),
+                        "--max-message-size", str(max_message_size), "--log-level", "warning", "--no-request-log"] + list(extra)
+        if secure:
+            self.command.append("--secure")
+        self.process:subprocess.Popen = None
+
+    def __enter__(self) -> "BenchmarkServer":
+        self.process = subprocess.Popen(self.command, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return self
+
+    def __exit__(self, *exc):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    @property
+    def running(self) -> bool:
+        return self.process.poll() is None
+
+
+class Case:
+    def __init__(self, name:str, type:str, secure:bool = False, size:int = 0, compressibility:float = 0.0):
+        self.name = name
+        self.type = type
+        self.secure = secure
+        self.size = size
+        self.compressibility = compressibility
+
+
+def build_cases(names:list[str], sizes:list[int]) -> list[Case]:
+    cases = []
+    if "unary" in names:
+        cases.append(Case("unary", "unary"))
+    if "stream" in names:
+        cases.append(Case("stream", "bidirectional"))
+    if "tls" in names:
+        cases += [Case("unary-tls", "unary", secure=True), Case("stream-tls", "bidirectional", secure=True)]
+    if "sizes" in names:
+        cases += [Case(f"unary-{size}B", "unary", size=size) for size in sizes]
+    return cases
+
+
+def build_pool(args:Any, port:int, secure:bool, limit:int, options:list[tuple[str, Any]] = (),
+               host:str = "127.0.0.1", compression:Optional[grpc.Compression] = None) -> ChannelPool:
+    # The bundled certificate has no loopback name in it, so TLS cases verify against one it does have
+    options = message_size_options(limit) + list(options)
+    if secure and args.tls_server_name:
+        options.append(("grpc.ssl_target_name_override", args.tls_server_name))
+    cert_path = os.getenv("GRPC_CERT_PATH", os.path.join(HERE, "certs", "server.crt"))
+
+    return ChannelPool([host], lambda host: make_channel(host, port, secure, cert_path, options, compression=compression),
+                       logger, args.workers)
+
+
+def measure(case:Case, args:Any, pool:ChannelPool, duration:float) -> tuple[RunRecorder, float, int]:
+    # Run one case for `duration` seconds, returns the recorder, throughput and error count
+    recorder = RunRecorder()
+    sizes = {"request_size": case.size, "response_size": case.size, "compressibility": case.compressibility}
+    if case.type != "bidirectional":
+        generator = LoadGenerator(lambda: CLIENT_TYPES[case.type](None, recorder=recorder, pool=pool, **sizes),
+                                  logger, recorder, workers=args.workers, inflight=args.inflight, duration=duration)
+        generator.run()
+        return recorder, generator.stats.throughput, generator.stats.errors
+
+    client = BidirectionalClient(None, recorder=recorder, pool=pool, **sizes)
+    bench = StreamBenchmark(client, logger, recorder, duration=duration, window=args.inflight)
+    bench.run()
+    counters = bench.counters
+    elapsed = max(bench.end_time - bench.start_time, 1e-9)
+    return recorder, counters.received / elapsed, counters.sent - counters.received
+
+
+def run_case(case:Case, args:Any, pool:ChannelPool) -> dict[str, Any]:
+    if args.warmup > 0:
+        measure(case, args, pool, args.warmup)
+
+    return summarize(case, *measure(case, args, pool, args.duration))
+
+
+def summarize(case:Case, recorder:RunRecorder, throughput:float, errors:int) -> dict[str, Any]:
+    hist = recorder.latency.overall()
+    ms = lambda us: round(us / 1000, 3)
+    return {"unit": "msg/s" if case.type == "bidirectional" else "rpc/s", "throughput": round(throughput, 1), "errors": errors,
+            "p50_ms": ms(hist.percentile(50)), "p90_ms": ms(hist.percentile(90)), "p99_ms": ms(hist.percentile(99)),
+            "p999_ms": ms(hist.percentile(99.9)), "max_ms": ms(hist.max_us)}
+
+
+def run_group(cases:list[Case], args:Any, port:int) -> dict[str, Any]:
+    # Cases sharing a service type and security share one server
+    first = cases[0]
+    limit = message_limit(*(case.size for case in cases))
+    results = {}
+
+    with BenchmarkServer(port, first.type, first.secure, args.engine, args.server_workers, limit) as server:
+        pool = build_pool(args, port, first.secure, limit)
+        try:
+            ready = pool.connect(10.0)
+            for case in cases:
+                if not ready or not server.running:
+                    reason = "server exited" if not server.running else \
+                             "could not connect" + (" (check the certificate in GRPC_CERT_PATH has not expired)" if first.secure else "")
+                    logger.error(f"Skipping {case.name}: {reason}")
+                    results[case.name] = {"skipped": reason}
+                    continue
+
+                logger.info(f"Running {case.name} for {args.duration:.0f}s")
+                results[case.name] = run_case(case, args, pool)
+        finally:
+            pool.close()
+
+    return results
+
+
+def compare(results:dict[str, Any], baseline:dict[str, Any], threshold:float) -> int:
+    """
+    Log every case against the baseline and return how many metrics regressed by more than threshold percent.
+    """
+    if baseline.get("settings") != results["settings"]:
+        logger.warning("Baseline was recorded with different settings, comparisons may not be like for like")
+
+    regressions = 0
+    for name, current in results["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None or "skipped" in before or "skipped" in current:
+            continue
+
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before.get(metric), current.get(metric)
+            if not old:
+                continue
+
+            change = 100.0 * (new - old) / old
+            worse = -change if higher_is_better else change
+            flag, color = "", Fore.WHITE
+            if worse > threshold:
+                regressions += 1
+                flag, color = "  REGRESSION", Fore.RED
+            elif worse < -threshold:
+                flag, color = "  improved", Fore.GREEN
+            logger.log(f"  {name:<16} {metric:<10} {old:>12.2f} -> {new:>12.2f} ({change:+.1f}%){flag}", color=color)
+
+    return regressions
+
+
+def host_info() -> dict[str, Any]:
+    return {"platform": platform.platform(), "python": platform.python_version(), "grpc": grpc.__version__,
+            "cpus": os.cpu_count()}
+
+
+def load_json(path:str) -> Optional[dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_json(path:str, data:dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def main():
+    bc = BenchmarkConfig( argparse.ArgumentParser(description="gRPC loopback benchmark"), logger )
+    args = bc.get_args()
+
+    # Group cases by the server they need, keeping the order they were asked for
+    groups:dict[tuple[str, bool], list[Case]] = {}
+    for case in build_cases(bc.cases, bc.sizes):
+        groups.setdefault((case.type, case.secure), []).append(case)
+
+    results = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": host_info(),
+               "settings": {k: getattr(args, k) for k in ("duration", "workers", "inflight", "engine", "server_workers")},
+               "cases": {}}
+    try:
+        for i, cases in enumerate(groups.values()):
+            results["cases"].update(run_group(cases, args, args.port + i))
+    except KeyboardInterrupt:
+        logger.log("Benchmark interrupted by user. Writing the cases that finished...", color=Fore.MAGENTA)
+
+    logger.log("Results:", color=Fore.CYAN)
+    for name, result in results["cases"].items():
+        if "skipped" in result:
+            logger.warning(f"  {name:<16} skipped: {result['skipped']}")
+        else:
+            logger.log(f"  {name:<16} {result['throughput']:>10.1f} {result['unit']}  p50={result['p50_ms']:.2f}ms "
+                       f"p99={result['p99_ms']:.2f}ms p99.9={result['p999_ms']:.2f}ms errors={result['errors']}", color=Fore.GREEN)
+
+    write_json(args.output, results)
+    logger.info(f"Results written to {args.output}")
+
+    baseline = load_json(args.baseline)
+    regressions = 0
+    if baseline is None:
+        logger.info(f"No baseline at {args.baseline}, run with --save-baseline to record one")
+    else:
+        logger.log(f"Compared with baseline from {baseline.get('timestamp', 'unknown')}:", color=Fore.CYAN)
+        regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        logger.info(f"Baseline saved to {args.baseline}")
+
+    if regressions:
+        logger.error(f"{regressions} metrics regressed by more than {args.threshold:.0f}%")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import json
+from colorama import Fore
+from typing import Any, Optional
+
+from logger import ColorLogger
+from scheduler import OpenLoopRunner
+from stats import RunRecorder
+
+
+class CapacitySearch:
+    """
+    Finds the highest open-loop rate the targets sustain within an SLO on p99 latency and error rate.
+
+    Every step holds one offered rate for `window` seconds on its own recorder, so each point on the curve
+    has its own percentiles.  'step' raises the rate by `step` until a step misses the SLO or `max_rate` is
+    reached.  'binary' doubles the rate until one misses, then bisects between the best pass and the first
+    miss until they are within `step` of each other.  Latency runs from the intended send time as in the
+    open-loop mode, so a saturated target shows up in p99 rather than as a lower send rate.
+
+    The knee is the point with the highest power, throughput divided by p99: below it more load buys
+    throughput for little latency, past it latency climbs faster than throughput.
+    """
+    def __init__(self, client:Any, log:ColorLogger, recorder:RunRecorder, start:float, step:float, max_rate:float,
+                 window:float, slo_p99_ms:float, slo_error_pct:float, method:str = "step", arrival:str = "constant",
+                 max_inflight:int = 1000):
+        self.client = client
+        self.log = log
+        self.recorder = recorder
+        self.start = start
+        self.step = step
+        self.max_rate = max_rate
+        self.window = window
+        self.slo_p99_ms = slo_p99_ms
+        self.slo_error_pct = slo_error_pct
+        self.method = method
+        self.arrival = arrival
+        self.max_inflight = max_inflight
+        self.points:list[dict[str, Any]] = []
+        self.interrupted = False
+
+    def measure(self, rate:float) -> bool:
+        # Hold one rate for the window, returns whether it met the SLO
+        step = RunRecorder()
+        runner = OpenLoopRunner(self.client, self.log, step, rate=rate, arrival=self.arrival,
+                                duration=self.window, max_inflight=self.max_inflight)
+        runner.run()
+        self.recorder.merge(step.snapshot())
+        if runner.interrupted:
+            self.interrupted = True
+            return False
+
+        stats, hist = runner.stats, step.latency.overall()
+        error_pct = 100.0 * stats.errors / stats.completed if stats.completed else 100.0
+        p99_ms = hist.percentile(99) / 1000
+        passed = hist.count > 0 and p99_ms <= self.slo_p99_ms and error_pct <= self.slo_error_pct
+        point = {"rate": round(rate, 1), "throughput": round(stats.throughput, 1), "p50_ms": round(hist.percentile(50) / 1000, 3),
+                 "p99_ms": round(p99_ms, 3), "error_pct": round(error_pct, 3), "max_lag_ms": round(runner.max_lag * 1000, 1),
+                 "passed": passed}
+        self.points.append(point)
+
+        color = Fore.GREEN if passed else Fore.YELLOW
+        self.log.log(f"{rate:.1f} rpc/s offered: {stats.throughput:.1f} achieved, p99 {p99_ms:.2f}ms, {error_pct:.3f}% errors, "
+                     f"{'meets' if passed else 'misses'} the SLO", color=color)
+        return passed
+
+    def run(self):
+        self.log.info(f"Searching ({self.method}) for the highest rate with p99 <= {self.slo_p99_ms:g}ms and "
+                      f"errors <= {self.slo_error_pct:g}%, {self.window:g}s per step")
+        if self.method == "step":
+            rate = self.start
+            while rate <= self.max_rate and self.measure(rate):
+                rate += self.step
+            return
+
+        # Double until a rate misses to bound the search, then bisect
+        passed, missed, rate = 0.0, None, self.start
+        while not self.interrupted:
+            if self.measure(rate):
+                passed = rate
+            elif not self.interrupted:
+                missed = rate
+            if missed is None:
+                if rate >= self.max_rate:
+                    return
+                rate = min(rate * 2, self.max_rate)
+            elif missed - passed <= self.step:
+                return
+            else:
+                rate = (passed + missed) / 2
+
+    @property
+    def capacity(self) -> Optional[dict[str, Any]]:
+        return max((p for p in self.points if p["passed"]), key=lambda p: p["rate"], default=None)
+
+    @property
+    def knee(self) -> Optional[dict[str, Any]]:
+        return max((p for p in self.points if p["p99_ms"] > 0), key=lambda p: p["throughput"] / p["p99_ms"], default=None)
+
+    def report(self):
+        self.log.log(f"  {'offered':>10} {'achieved':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors %':>9}", color=Fore.CYAN)
+        knee = self.knee
+        for p in sorted(self.points, key=lambda p: p["rate"]):
+            mark = "  knee" if p is knee else ""
+            self.log.log(f"  {p['rate']:>10.1f} {p['throughput']:>10.1f} {p['p50_ms']:>9.2f} {p['p99_ms']:>9.2f} {p['error_pct']:>9.3f}{mark}",
+                         color=Fore.WHITE if p["passed"] else Fore.YELLOW)
+
+        capacity = self.capacity
+        if capacity is None:
+            self.log.warning(f"No rate met the SLO, the lowest tried was {min((p['rate'] for p in self.points), default=self.start):.1f} rpc/s")
+        else:
+            limit = " (the --max-rate limit)" if not self.interrupted and all(p["passed"] for p in self.points) else ""
+            self.log.log(f"Capacity: {capacity['rate']:.1f} rpc/s{limit} at p99 {capacity['p99_ms']:.2f}ms", color=Fore.GREEN)
+        if knee is not None:
+            self.log.log(f"Knee: {knee['rate']:.1f} rpc/s offered, {knee['throughput']:.1f} achieved at p99 {knee['p99_ms']:.2f}ms",
+                         color=Fore.GREEN)
+
+    def write(self, path:str):
+        capacity, knee = self.capacity, self.knee
+        with open(path, "w") as f:
+            json.dump({"method": self.method, "window": self.window,
+                       "slo": {"p99_ms": self.slo_p99_ms, "error_pct": self.slo_error_pct},
+                       "capacity_rps": capacity["rate"] if capacity else None, "knee_rps": knee["rate"] if knee else None,
+                       "curve": sorted(self.points, key=lambda p: p["rate"])}, f, indent=2)
+            f.write("\n")
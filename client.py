@@ -1,107 +1,334 @@
 import os
 import grpc
+import copy
+import math
+import queue
+import signal
+import functools
+import multiprocessing
 import argparse
 import time
 import random
+from concurrent import futures
 from colorama import Fore
-from typing import Any
+from typing import Any, Iterator, Optional
+from contextlib import contextmanager
 
 
 from logger import ColorLogger
 from config import ClientConfig
-from grpc_api import pb2, pb2_grpc, bidir, pb2_grpc_bidir
+from loadgen import LoadGenerator
+from scheduler import OpenLoopRunner
+from pool import ChannelPool, PooledChannel
+from streambench import StreamBenchmark
+from multistream import MultiStreamBenchmark
+from connbench import ConnectionBenchmark
+from payload import COMPRESSION, make_payload, message_limit, message_size_options
+from stats import RunRecorder, PeriodicReporter, start_reporter
+from results import ResultLog, TraceLog, status_of
+from failover import FailoverDetector
+from replay import ReplayRunner, merge_traces
+from servertime import server_time
+from capacity import CapacitySearch
+from grpc_api import pb2, pb2_grpc, bidir, pb2_grpc_bidir, sstream, pb2_grpc_sstream, cstream, pb2_grpc_cstream, BACKEND_METADATA_KEY
 
 # Get logging
 logger = ColorLogger("gRPC Client")
 
 
+@functools.lru_cache(maxsize=None)
+def load_credentials(cert_path:str) -> grpc.ChannelCredentials:
+    # Read the trusted server certificate (CA certificate) once per path, rebuilt channels reuse the
+    # credentials rather than reopening the file.  Errors aren't cached, so a fixed file is picked up.
+    with open(cert_path, 'rb') as f:
+        trusted_certs = f.read()
+    return grpc.ssl_channel_credentials(root_certificates=trusted_certs)
+
+
+def make_channel(host:str, port:int, secure:bool = False, cert_path:str = None, options:list[tuple[str, Any]] = (),
+                 aio:bool = False, compression:Optional[grpc.Compression] = None) -> grpc.Channel:
+    # grpc.aio has the same channel constructors, returning asyncio channels
+    cert_path = cert_path or os.getenv("GRPC_CERT_PATH", "./certs/server.crt")
+    options = BaseClient.CHANNEL_OPTIONS + list(options)
+    module = grpc.aio if aio else grpc
+    if secure:
+        try:
+            credentials = load_credentials(cert_path)
+
+            # Create a secure channel
+            return module.secure_channel(f'{host}:{port}', credentials, options=options, compression=compression)
+
+        except FileNotFoundError:
+            logger.error(f"The file {cert_path} was not found.")
+        except PermissionError:
+            logger.error(f"You do not have permission to read {cert_path}.")
+        except OSError as e:
+            logger.error(f"An unexpected OS error occurred: {e}")
+
+    else:
+        return module.insecure_channel(f'{host}:{port}', options=options, compression=compression)
+
+
 class BaseClient:
-    def __init__(self, host:str, port:int = 50051, secure:bool = False):
+    # gRPC shares connections between channels to the same target through a global subchannel pool.
+    # Give every channel its own connection so separate clients really are separate TCP sessions.
+    CHANNEL_OPTIONS = [("grpc.use_local_subchannel_pool", 1)]
+
+    # Stub class for the service and the rpc type traces record, set in inherited classes
+    STUB:type = None
+    RPC_TYPE:str = None
+
+    def __init__(self, host:str, port:int = 50051, secure:bool = False, recorder:RunRecorder = None, pool:ChannelPool = None,
+                 request_size:int = 0, response_size:int = 0, channel_options:list[tuple[str, Any]] = (),
+                 compression:Optional[grpc.Compression] = None, compressibility:float = 0.0):
         self.host = host
         self.port = port
         self.secure = secure
+        self.recorder = recorder
+        self.request_size = request_size
+        self.response_size = response_size
+        self.channel_options = list(channel_options)
+        self.compression = compression
+        self.payload = make_payload(request_size, compressibility)
+        self.retries = 0
+        self.call_compression:Optional[grpc.Compression] = None
+        # Messages each rpc sends, and where sent rpcs are traced
+        self.stream_length = 1
+        self.trace:Optional[TraceLog] = None
         self.cert_path = os.getenv("GRPC_CERT_PATH", "./certs/server.crt")
-        self.channel = self._get_channel(secure)
+
+        # A pooled client borrows a warm channel from the pool for every call, otherwise it owns one
+        # channel to host
+        self.pool = pool
+        self.channel = self._get_channel(secure) if pool is None else None
+        self.stub = self._get_stub(self.channel) if pool is None else None
 
         
     def _get_channel(self, secure:bool=False) -> grpc.Channel:
-        if secure:
-            try:
-                # Load the trusted server certificate (CA certificate)
-                with open(self.cert_path, 'rb') as f:
-                    trusted_certs = f.read()
-            
-                # Create SSL credentials
-                credentials = grpc.ssl_channel_credentials(root_certificates=trusted_certs)
-
-                # Create a secure channel
-                return grpc.secure_channel(f'{self.host}:{self.port}', credentials)
-
-            except FileNotFoundError:
-                logger.error(f"The file {self.cert_path} was not found.")
-            except PermissionError:
-                logger.error(f"You do not have permission to read {self.cert_path}.")
-            except OSError as e:
-                logger.error(f"An unexpected OS error occurred: {e}")
+        return make_channel(self.host, self.port, secure, self.cert_path, message_size_options(message_limit(self.request_size, self.response_size)) + self.channel_options,
+                            compression=self.compression)
 
-        else:
-            return grpc.insecure_channel(f'{self.host}:{self.server_port}')
+    def _get_stub(self, channel:grpc.Channel):
+        return self.STUB(channel)
 
-        def _get_stub(self):
-            # Ensure this gets written in inherited classes
-            raise NotImplementedError
-        
-        def run(self, target:Any):
-            # Execute whatever task the client does
-            raise NotImplementedError
+    def _acquire(self) -> tuple[str, Any, Optional[PooledChannel]]:
+        # Pick the channel for one call, returns (target, stub, pool lease)
+        if self.pool is None:
+            return self.host, self.stub, None
+
+        pc = self.pool.acquire()
+        return pc.target, pc.stub(self.STUB), pc
+
+    def _release(self, lease:Optional[PooledChannel]):
+        if lease is not None:
+            self.pool.release(lease)
+
+    def _call(self, stub:Any) -> Any:
+        # Execute a single rpc on the stub without logging
+        raise NotImplementedError
+
+    def _start_call(self, stub:Any, executor:futures.Executor) -> futures.Future:
+        # Sync streaming calls have no native future, so run them on the supplied executor.  Clients
+        # with a non-blocking form of their rpc should override this.
+        return executor.submit(self._call, stub)
+
+    def _traced(self):
+        # Note an rpc being sent, retries aren't traced as they aren't part of the offered load
+        if self.trace is not None:
+            self.trace.write(time.perf_counter(), self.RPC_TYPE, self.request_size, self.response_size, self.stream_length)
+
+    def call(self) -> tuple[str, Any]:
+        # Execute a single rpc without logging, returns the target that served it and the result
+        self._traced()
+        target, stub, lease = self._acquire()
+        try:
+            return target, self._call(stub)
+        finally:
+            self._release(lease)
+
+    def call_future(self, executor:futures.Executor) -> tuple[str, Any]:
+        # Start a single rpc - used by the load generator.  Returns the target and a future for the result.
+        self._traced()
+        target, future = self._call_future(executor)
+        if not self.retries:
+            return target, future
+
+        # Retry UNAVAILABLE on the next pooled channel, the returned future counts the retries it took
+        # and holds the target of the last attempt, the one that served it
+        outer = futures.Future()
+        outer.retries = 0
+        outer.target = target
+
+        def done(f:Any):
+            code, result = status_of(f)
+            if code == grpc.StatusCode.UNAVAILABLE.value[0] and outer.retries < self.retries:
+                outer.retries += 1
+                try:
+                    outer.target, retry = self._call_future(executor)
+                    retry.add_done_callback(done)
+                    return
+                except Exception as e:
+                    outer.set_exception(e)
+                    return
+            if result is not None:
+                # The server's timing is read from the call that succeeded
+                outer.trailing_metadata = getattr(f, "trailing_metadata", None)
+                outer.set_result(result)
+            else:
+                outer.set_exception(f.exception() if not f.cancelled() else grpc.FutureCancelledError())
+
+        future.add_done_callback(done)
+        return target, outer
+
+    def _call_future(self, executor:futures.Executor) -> tuple[str, Any]:
+        target, stub, lease = self._acquire()
+        try:
+            future = self._start_call(stub, executor)
+        except Exception:
+            self._release(lease)
+            raise
+
+        if lease is not None:
+            future.add_done_callback(lambda f: self._release(lease))
+        return target, future
+
+    def run(self):
+        # Execute whatever task the client does
+        raise NotImplementedError
+
+    def close(self):
+        # Pooled channels belong to the pool
+        if self.channel is not None:
+            self.channel.close()
+
+    def backend_of(self, result:Any) -> Optional[tuple[str, int]]:
+        # (backend name, server request count) when the rpc result identifies who served it
+        return None
+
+    def payload_bytes(self, result:Any) -> tuple[int, int]:
+        # Payload bytes (sent, received) by one rpc, nothing is received when it failed
+        return self.request_size, 0
+
+    def transfer_of(self, result:Any) -> Optional[tuple[float, int, int, float]]:
+        # Streaming rpcs: (seconds to the first message, messages, payload bytes, seconds after the first)
+        return None
+
+    def server_time_of(self, result:Any, call:Any = None) -> Optional[tuple[float, Optional[float]]]:
+        # (seconds in the server's handler, seconds queued before it) from the call's trailing metadata,
+        # streaming clients read it in _call and keep it in their result
+        if isinstance(result, StreamResult):
+            return result.server_time
+        metadata = getattr(call, "trailing_metadata", None)
+        return server_time(metadata()) if metadata is not None else None
+
+    def record(self, target:Any, start:float, result:Any = None, call:Any = None):
+        if self.recorder is not None:
+            latency = time.perf_counter() - start
+            self.recorder.record(target, latency, self.backend_of(result))
+            transfer = self.transfer_of(result) if result is not None else None
+            if transfer is not None:
+                self.recorder.record_transfer(target, *transfer)
+            timing = self.server_time_of(result, call)
+            if timing is not None:
+                self.recorder.record_server_time(target, latency, *timing)
 
 
 class UnaryClient(BaseClient):
-    def __init__(self, host:str, port:int = 50051, secure:bool = False):
-        super().__init__(host, port, secure)
-        self.stub = self._get_stub()
+    STUB = pb2_grpc.UnaryStub
+    RPC_TYPE = "unary"
+
+    def __init__(self, host:str, port:int = 50051, secure:bool = False, recorder:RunRecorder = None, pool:ChannelPool = None,
+                 request_size:int = 0, response_size:int = 0, channel_options:list[tuple[str, Any]] = (),
+                 compression:Optional[grpc.Compression] = None, compressibility:float = 0.0):
+        super().__init__(host, port, secure, recorder, pool, request_size, response_size, channel_options, compression, compressibility)
         self.message:str =  "Hello Server you there?"
+        self.request = pb2.Message(message=self.message, payload=self.payload, response_size=response_size)
+
+    def _call(self, stub:Any) -> Any:
+        return stub.GetServerResponse(self.request, compression=self.call_compression)
 
-    def _get_stub(self):
-        return pb2_grpc.UnaryStub(self.channel)
+    def _start_call(self, stub:Any, executor:futures.Executor) -> grpc.Future:
+        # Unary calls are natively asynchronous, no need for an executor thread
+        return stub.GetServerResponse.future(self.request, compression=self.call_compression)
 
-    def run(self, target:Any):
+    def backend_of(self, result:Any) -> Optional[tuple[str, int]]:
+        if not result.hostname:
+            return None
+        return f"{result.hostname}:{result.pid}", result.request_count
+
+    def payload_bytes(self, result:Any) -> tuple[int, int]:
+        return self.request_size, len(result.payload) if result is not None else 0
+
+    def run(self):
         """
         Client function to call the rpc for GetServerResponse
         """
-        request = pb2.Message(message=self.message)
-        response = self.stub.GetServerResponse(request)
+        # Through the future so the call's trailing metadata, with the server's timing, can be read
+        start = time.perf_counter()
+        target, future = self.call_future(None)
+        response = future.result()
+        self.record(target, start, response, future)
 
         logger.log(f"Response from {target}: {response.message}", color=Fore.GREEN)
     
 
-class BidirectionalClient:
-    def __init__(self, host:str, port:int = 50051, secure:bool = False):
-        super().__init__(host, port, secure)
-        self.stub = self._get_stub()
-
-    def _get_stub(self):
-        return pb2_grpc_bidir.BidirectionalStub(self.channel)
-
-    def run(self, target:Any):
+class BidirectionalClient(BaseClient):
+    STUB = pb2_grpc_bidir.BidirectionalStub
+    RPC_TYPE = "bidirectional"
+    MESSAGES = ["First message", "Second message", "Third message", "Fourth message", "Fifth message"]
+
+    def __init__(self, host:str, port:int = 50051, secure:bool = False, recorder:RunRecorder = None, pool:ChannelPool = None,
+                 request_size:int = 0, response_size:int = 0, channel_options:list[tuple[str, Any]] = (),
+                 compression:Optional[grpc.Compression] = None, compressibility:float = 0.0):
+        super().__init__(host, port, secure, recorder, pool, request_size, response_size, channel_options, compression, compressibility)
+        self.stream_length = len(self.MESSAGES)
+
+    def _call(self, stub:Any) -> "StreamResult":
+        # Drain the whole echo stream so the rpc runs to completion, keeping only the sizes
+        messages = (self.make_message(self.MESSAGES[i % len(self.MESSAGES)]) for i in range(self.stream_length))
+        start = time.perf_counter()
+        call = stub.GetServerResponse(messages, compression=self.call_compression)
+        count, size, first = 0, 0, None
+        for response in call:
+            if first is None:
+                first = time.perf_counter()
+            count += 1
+            size += len(response.payload)
+        first = first or time.perf_counter()
+        return StreamResult(count, size, first - start, time.perf_counter() - first, server_time=server_time(call.trailing_metadata()))
+
+    def payload_bytes(self, result:Any) -> tuple[int, int]:
+        return self.stream_length * self.request_size, result.size if result is not None else 0
+
+    @contextmanager
+    def stream(self, messages:Iterator[Any]) -> Iterator[tuple[str, Any]]:
+        # Open a long lived stream on one channel, the caller drives it.  Yields (target, responses).
+        target, stub, lease = self._acquire()
+        try:
+            yield target, stub.GetServerResponse(messages, compression=self.call_compression)
+        finally:
+            self._release(lease)
+
+    def run(self):
         """
         Client function to call the rpc for GetServerResponse
         """
-        responses = self.stub.GetServerResponse(self.generate_messages())
-
-        for response in responses:
-            logger.log(f"Hello from the server received your {response.message}\n", color=Fore.GREEN)
+        self._traced()
+        target, stub, lease = self._acquire()
+        try:
+            start = time.perf_counter()
+            responses = stub.GetServerResponse(self.generate_messages(), compression=self.call_compression)
+
+            for response in responses:
+                logger.log(f"Hello from the server received your {response.message}\n", color=Fore.GREEN)
+            self.record(target, start, call=responses)
+        finally:
+            self._release(lease)
 
         logger.log(f"Completed bidirectional communication with {target}", color=Fore.GREEN)
 
     def generate_messages(self):
-        messages = [
-            self.make_message("First message"),
-            self.make_message("Second message"),
-            self.make_message("Third message"),
-            self.make_message("Fourth message"),
-            self.make_message("Fifth message"),
-        ]
+        messages = [self.make_message(m) for m in self.MESSAGES]
 
         for msg in messages:
             logger.log(f"Hello Server, sending you the {msg.message}\n", color=Fore.YELLOW)
@@ -109,27 +336,379 @@ class BidirectionalClient:
 
         
     def make_message(self, message:Any):
-        return bidir.Message( message=message )
-
-
-def build_client(args:Any, target:Any) -> BaseClient:
-    if args.type == "unary":
-        return UnaryClient(target, args.port, args.secure)
-
-    elif args.type == "bidirectional":
-        return BidirectionalClient(target, args.port, args.secure)
-        
-    else:
-        logger.log(f"Unknown service type: {args.service_type}", color=Fore.RED)
+        return bidir.Message( message=message, payload=self.payload, response_size=self.response_size )
+
+
+class StreamResult:
+    """
+    What one server or client streaming rpc moved.  first_message is seconds until the first message got
+    through, seconds is the time from it to the last one.
+    """
+    def __init__(self, messages:int, size:int, first_message:float, seconds:float, backend:Optional[str] = None,
+                 request_count:int = 0, server_time:Optional[tuple[float, Optional[float]]] = None):
+        self.messages = messages
+        self.size = size
+        self.first_message = first_message
+        self.seconds = seconds
+        self.backend = backend
+        self.request_count = request_count
+        self.server_time = server_time
+
+
+class ServerStreamingClient(BaseClient):
+    """
+    One request, then `stream_length` messages of response_size bytes streamed back, like a large download.
+    Time to the first message and the transfer after it are timed on the client as the messages arrive.
+    """
+    STUB = pb2_grpc_sstream.ServerStreamingStub
+    RPC_TYPE = "server-streaming"
+
+    def __init__(self, host:str, port:int = 50051, secure:bool = False, recorder:RunRecorder = None, pool:ChannelPool = None,
+                 request_size:int = 0, response_size:int = 0, channel_options:list[tuple[str, Any]] = (),
+                 compression:Optional[grpc.Compression] = None, compressibility:float = 0.0):
+        super().__init__(host, port, secure, recorder, pool, request_size, response_size, channel_options, compression, compressibility)
+        self.stream_length = 10
+
+    def _call(self, stub:Any) -> StreamResult:
+        # Only sizes are kept, holding every message of a long download would cost its whole size in memory
+        request = sstream.StreamRequest(message="Send me a stream", payload=self.payload, response_size=self.response_size,
+                                        count=self.stream_length)
+        start = time.perf_counter()
+        call = stub.GetServerResponse(request, compression=self.call_compression)
+        messages, size, first, last = 0, 0, start, start
+        for message in call:
+            last = time.perf_counter()
+            if not messages:
+                first = last
+            messages += 1
+            size += len(message.payload)
+        backend = dict(call.initial_metadata()).get(BACKEND_METADATA_KEY)
+        return StreamResult(messages, size, first - start, last - first, backend, server_time=server_time(call.trailing_metadata()))
+
+    def backend_of(self, result:Any) -> Optional[tuple[str, int]]:
+        return (result.backend, 0) if result.backend else None
+
+    def payload_bytes(self, result:Any) -> tuple[int, int]:
+        return self.request_size, result.size if result is not None else 0
+
+    def transfer_of(self, result:Any) -> Optional[tuple[float, int, int, float]]:
+        return result.first_message, result.messages, result.size, result.seconds
+
+    def run(self):
+        start = time.perf_counter()
+        target, result = self.call()
+        self.record(target, start, result)
+        rate = f"{result.size / result.seconds / 1e6:.2f} MB/s" if result.seconds > 0 else "n/a"
+        logger.log(f"Received {result.messages} messages ({result.size} bytes) from {target}: first after "
+                   f"{result.first_message * 1000:.2f}ms, then {rate}", color=Fore.GREEN)
+
+
+class ClientStreamingClient(BaseClient):
+    """
+    `stream_length` messages of request_size bytes streamed up, like a bulk upload, and one summary back.
+    The server times the first message's arrival and the transfer after it, so proxy buffering shows.
+    """
+    STUB = pb2_grpc_cstream.ClientStreamingStub
+    RPC_TYPE = "client-streaming"
+
+    def __init__(self, host:str, port:int = 50051, secure:bool = False, recorder:RunRecorder = None, pool:ChannelPool = None,
+                 request_size:int = 0, response_size:int = 0, channel_options:list[tuple[str, Any]] = (),
+                 compression:Optional[grpc.Compression] = None, compressibility:float = 0.0):
+        super().__init__(host, port, secure, recorder, pool, request_size, response_size, channel_options, compression, compressibility)
+        self.stream_length = 10
+
+    def _messages(self) -> Iterator[Any]:
+        for seq in range(self.stream_length):
+            yield cstream.StreamMessage(seq=seq, payload=self.payload)
+
+    def _call(self, stub:Any) -> StreamResult:
+        summary, call = stub.GetServerResponse.with_call(self._messages(), compression=self.call_compression)
+        return StreamResult(summary.messages, summary.bytes_received, summary.first_message_us / 1e6,
+                            summary.transfer_us / 1e6, f"{summary.hostname}:{summary.pid}", summary.request_count,
+                            server_time(call.trailing_metadata()))
+
+    def backend_of(self, result:Any) -> Optional[tuple[str, int]]:
+        return result.backend, result.request_count
+
+    def payload_bytes(self, result:Any) -> tuple[int, int]:
+        return self.stream_length * self.request_size, 0
+
+    def transfer_of(self, result:Any) -> Optional[tuple[float, int, int, float]]:
+        return result.first_message, result.messages, result.size, result.seconds
+
+    def run(self):
+        start = time.perf_counter()
+        target, result = self.call()
+        self.record(target, start, result)
+        rate = f"{result.size / result.seconds / 1e6:.2f} MB/s" if result.seconds > 0 else "n/a"
+        logger.log(f"Sent {result.messages} messages ({result.size} bytes) to {target}, served by {result.backend}: "
+                   f"first arrived {result.first_message * 1000:.2f}ms after the rpc, then {rate}", color=Fore.GREEN)
+
+
+# Client class for each --type
+CLIENT_TYPES = {"unary": UnaryClient, "bidirectional": BidirectionalClient,
+                "server-streaming": ServerStreamingClient, "client-streaming": ClientStreamingClient}
+
+
+def build_client(args:Any, target:Any, recorder:RunRecorder = None, pool:ChannelPool = None, trace:TraceLog = None) -> BaseClient:
+    settings = {"request_size": args.request_size, "response_size": args.response_size, "channel_options": args.channel_option,
+                "compression": COMPRESSION[args.compression], "compressibility": args.compressibility}
+    if args.type not in CLIENT_TYPES:
+        logger.log(f"Unknown service type: {args.type}", color=Fore.RED)
         raise NotImplementedError
 
-def message_target(client:BaseClient, target:Any):
+    client = CLIENT_TYPES[args.type](target, args.port, args.secure, recorder, pool, **settings)
+    if args.type in ("server-streaming", "client-streaming"):
+        client.stream_length = args.messages
+    client.retries = args.retries
+    client.trace = trace
+    if args.call_compression:
+        client.call_compression = COMPRESSION[args.call_compression]
+    return client
+
+def build_pool(args:Any, targets:list[str]) -> ChannelPool:
+    # By default serial and stream runs need one channel per target, load runs one per worker as they had before
+    per_target = args.channels_per_target
+    if per_target == 0:
+        per_target = 1 if args.mode in ("serial", "stream") else math.ceil(args.workers / len(targets))
+
+    options = message_size_options(message_limit(args.request_size, args.response_size)) + args.channel_option
+    compression = COMPRESSION[args.compression]
+    pool = ChannelPool(targets, lambda host: make_channel(host, args.port, args.secure, options=options, compression=compression),
+                       logger, per_target, args.balance)
+    pool.connect(args.connect_timeout)
+    return pool
+
+
+def run_load(args:Any, pool:ChannelPool, recorder:RunRecorder):
+    generator = LoadGenerator(lambda: build_client(args, None, pool=pool, trace=recorder.trace), logger, recorder,
+                              workers=args.workers, inflight=args.inflight, duration=args.duration)
+    generator.run()
+    generator.report()
+    return generator.stats
+
+
+def run_open_loop(args:Any, pool:ChannelPool, recorder:RunRecorder):
+    # Replaces the per-iteration sleeps: sends follow the schedule, spread over the pool's channels
+    runner = OpenLoopRunner(build_client(args, None, pool=pool, trace=recorder.trace), logger, recorder,
+                            rate=args.rate, arrival=args.arrival, duration=args.duration,
+                            max_inflight=args.workers * args.inflight)
+    runner.run()
+    runner.report()
+    return runner.stats
+
+
+def run_capacity(args:Any, pool:ChannelPool, recorder:RunRecorder):
+    # Open-loop steps at rising rates, each on its own recorder and merged into the run's for the final report
+    search = CapacitySearch(build_client(args, None, pool=pool), logger, recorder, start=args.rate, step=args.rate_step,
+                            max_rate=args.max_rate, window=args.duration, slo_p99_ms=args.slo_p99, slo_error_pct=args.slo_errors,
+                            method=args.search, arrival=args.arrival, max_inflight=args.workers * args.inflight)
+    try:
+        search.run()
+    finally:
+        search.report()
+        if args.curve:
+            search.write(args.curve)
+            logger.info(f"Capacity curve written to {args.curve}")
+
+
+def run_replay(args:Any, pool:ChannelPool, recorder:RunRecorder):
+    # A client per traced rpc shape, the least recently used dropped so a wide size mix stays bounded
+    @functools.lru_cache(maxsize=256)
+    def client_for(type:str, request_size:int, response_size:int, messages:int) -> BaseClient:
+        shape = copy.copy(args)
+        shape.type, shape.request_size, shape.response_size = type, request_size, response_size
+        client = build_client(shape, None, pool=pool, trace=recorder.trace)
+        client.stream_length = messages
+        return client
+
+    runner = ReplayRunner(client_for, logger, recorder, merge_traces(args.replay), speed=args.speed,
+                          max_inflight=args.workers * args.inflight)
+    runner.run()
+    runner.report()
+    return runner.stats
+
+
+def run_stream(args:Any, pool:ChannelPool, recorder:RunRecorder, reporter:PeriodicReporter):
+    # Always a bidirectional stream, whatever --type says
+    client = BidirectionalClient(None, args.port, args.secure, recorder, pool, request_size=args.request_size,
+                                 response_size=args.response_size, compressibility=args.compressibility)
+    if args.call_compression:
+        client.call_compression = COMPRESSION[args.call_compression]
+    bench = StreamBenchmark(client, logger, recorder, rate=args.stream_rate, count=args.stream_count,
+                            duration=args.duration, window=args.inflight)
+    if reporter:
+        reporter.add(lambda seconds: bench.report_interval(logger, seconds))
+
+    bench.run()
+    bench.report()
+
+
+def run_streams(args:Any, targets:list[str], recorder:RunRecorder, reporter:PeriodicReporter):
+    # Runs on its own asyncio channels rather than the pool, so streams cost a task each instead of a thread
+    options = message_size_options(message_limit(args.request_size, args.response_size)) + args.channel_option
+    compression = COMPRESSION[args.compression]
+    bench = MultiStreamBenchmark(targets, lambda host: make_channel(host, args.port, args.secure, options=options, aio=True,
+                                                                    compression=compression),
+                                 logger, recorder, streams=args.streams, per_target=args.channels_per_target or 1,
+                                 rate=args.stream_rate, duration=args.duration, payload=make_payload(args.request_size, args.compressibility),
+                                 response_size=args.response_size, connect_timeout=args.connect_timeout)
+    if reporter:
+        reporter.add(lambda seconds: bench.report_interval(logger, seconds))
+
+    bench.run()
+    bench.report()
+
+
+def run_connect(args:Any, targets:list[str], recorder:RunRecorder, reporter:PeriodicReporter):
+    # Every attempt builds a client with its own new channel, the pool would defeat the point
+    recorder.latency.title = "First rpc latency"
+    bench = ConnectionBenchmark(targets, lambda target: build_client(args, target), logger, recorder,
+                                rate=args.rate, duration=args.duration, max_inflight=args.workers * args.inflight,
+                                connect_timeout=args.connect_timeout)
+    if reporter:
+        reporter.add(lambda seconds: bench.report_interval(logger, seconds))
+
+    bench.run()
+    bench.report()
+
+
+def run_mode(args:Any, targets:list[str], recorder:RunRecorder, reporter:PeriodicReporter) -> Any:
+    # Every mode except rebuilding each message runs over warm channels to all targets.  The streams mode
+    # builds its own asyncio channels and the connect mode a new channel per attempt.
+    rebuild = args.rebuild_tcp_each_message and args.mode == "serial"
+    pool = None if rebuild or args.mode in ("streams", "connect") else build_pool(args, targets)
+    if args.record:
+        recorder.results = ResultLog(args.record)
+    if args.failover:
+        recorder.failover = FailoverDetector(logger, args.failover_window)
+    if args.trace:
+        recorder.trace = TraceLog(args.trace)
+
     try:
-        logger.info(f"Trying to connect to {target}...")
-        client.run(target)
+        # The load modes return their run stats, which time the run without the pool's connect
+        if args.mode == "load":
+            return run_load(args, pool, recorder)
+        elif args.mode == "open-loop":
+            return run_open_loop(args, pool, recorder)
+        elif args.mode == "replay":
+            return run_replay(args, pool, recorder)
+        elif args.mode == "capacity":
+            run_capacity(args, pool, recorder)
+        elif args.mode == "stream":
+            run_stream(args, pool, recorder, reporter)
+        elif args.mode == "streams":
+            run_streams(args, targets, recorder, reporter)
+        elif args.mode == "connect":
+            run_connect(args, targets, recorder, reporter)
+        else:
+            run_serial(args, targets, pool, recorder)
+    finally:
+        if pool:
+            pool.close()
+        if recorder.results:
+            recorder.results.close()
+            logger.info(f"Every rpc recorded in {args.record}, summarise it with analyze.py")
+        if recorder.trace:
+            recorder.trace.close()
+            logger.info(f"Trace written to {args.trace}, replay it with --mode replay --replay {args.trace}")
+        if recorder.failover:
+            recorder.failover.finish()
+            recorder.failover.report()
+
+
+def process_args(args:Any, index:int) -> Any:
+    # Each process runs the mode with its share of the offered rate, per-process settings like
+    # --workers and --inflight apply to every process as given
+    share = copy.copy(args)
+    share.rate = args.rate / args.processes
+    if args.record:
+        share.record = f"{args.record}.{index}"
+    if args.trace:
+        share.trace = f"{args.trace}.{index}"
+    return share
+
+
+def run_process(args:Any, targets:list[str], index:int, results:Any):
+    # The coordinator owns ctrl-c and forwards it as SIGTERM, the same as the server's workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    # The coordinator reports for every process, only warnings and errors come from here
+    ColorLogger.configure(level="warning")
+    logger.name = f"gRPC Client[{index}:{os.getpid()}]"
+
+    recorder = RunRecorder()
+    reporter = start_reporter(args.report_interval, lambda seconds: results.put(("snapshot", index, recorder.snapshot(), None)))
+    stats = None
+    try:
+        stats = run_mode(args, targets, recorder, None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if reporter:
+            reporter.stop()
+        results.put(("done", index, recorder.snapshot(), stats.elapsed if stats else 0.0))
+
+
+def collect_snapshots(results:Any, processes:list[Any], recorder:RunRecorder, elapsed:dict[int, float]):
+    # Merge snapshots until every process has sent its last one, or has died without it
+    while len(elapsed) < len(processes):
+        try:
+            kind, index, snapshot, seconds = results.get(timeout=1.0)
+        except queue.Empty:
+            if not any(p.is_alive() for i, p in enumerate(processes) if i not in elapsed):
+                logger.error(f"{len(processes) - len(elapsed)} client processes exited without reporting")
+                return
+            continue
+
+        recorder.merge(snapshot)
+        if kind == "done":
+            elapsed[index] = seconds
+
+
+def run_processes(args:Any, targets:list[str]):
+    """
+    Coordinator for --processes N: spawns N client processes each running the mode, and merges the
+    histogram snapshots they send back into one live and final report.
+    """
+    # Spawn rather than fork: the gRPC runtime must not be initialised before the child starts
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [ctx.Process(target=run_process, args=(process_args(args, i), targets, i, results), name=f"grpc-client-{i}")
+                 for i in range(args.processes)]
+
+    recorder = RunRecorder()
+    elapsed:dict[int, float] = {}
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} client processes: {[p.pid for p in processes]}")
+    if args.record:
+        logger.info(f"Each process records its rpcs in {args.record}.N, pass them all to analyze.py")
+    reporter = start_reporter(args.report_interval, lambda seconds: recorder.report_interval(logger, seconds))
 
-    except Exception as e:
-        logger.log(f"Failed to connect to {target}: {e}", color=Fore.RED)  
+    try:
+        collect_snapshots(results, processes, recorder, elapsed)
+    except KeyboardInterrupt:
+        logger.log("Client interrupted by user. Stopping client processes...", color=Fore.MAGENTA)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        collect_snapshots(results, processes, recorder, elapsed)
+    finally:
+        if reporter:
+            reporter.stop()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                logger.error(f"Client process {process.pid} did not exit, killing it")
+                process.kill()
+
+        recorder.report(logger)
+        overall, seconds = recorder.latency.overall(), max(elapsed.values(), default=0.0)
+        if seconds > 0:
+            logger.log(f"Combined over {len(processes)} processes: {overall.count} rpcs in {seconds:.2f}s, "
+                       f"{overall.count / seconds:.1f} rpcs/s, {recorder.errors} errors", color=Fore.GREEN)
 
 
 def main():
@@ -137,28 +716,47 @@ def main():
     args = cs.get_args()
 
     targets = [t.strip() for t in args.targets.split(",")]
-    client:BaseClient = None
+    if args.processes > 1:
+        run_processes(args, targets)
+        return
+
+    # Latency and backend distribution are reported every report interval and once more at the end
+    recorder = RunRecorder()
+    reporter = start_reporter(args.report_interval, lambda seconds: recorder.report_interval(logger, seconds))
+
+    try:
+        run_mode(args, targets, recorder, reporter)
+    finally:
+        if reporter:
+            reporter.stop()
+        recorder.report(logger)
+
 
+def run_serial(args:Any, targets:list[str], pool:ChannelPool, recorder:RunRecorder):
     try:
         iteration = 0
 
         # If we only build the connection once, do it outside the test loop.
-        if not args.rebuild_tcp_each_message:
-            client:BaseClient = build_client(args, targets[0])
+        if pool is not None:
+            client:BaseClient = build_client(args, None, recorder, pool, recorder.trace)
 
         while True:
             iteration += 1
             logger.log(f"Starting iteration {iteration}", color=Fore.CYAN)
 
-            # If not rebuilding each time, only use first target and exec client.  Otherwise, the client
-            # needs to get built each loop and for each target within each loop. 
-            if not args.rebuild_tcp_each_message:
-                client.run(targets[0])
+            # Pooled clients take the next warm channel for each call, so one call per target covers
+            # every target.  Otherwise the client gets built and torn down for each target in each loop.
+            if pool is not None:
+                for _ in targets:
+                    client.run()
 
             else:
                 for target in targets:
-                    client = build_client(args, target)
-                    client.run(target)
+                    client = build_client(args, target, recorder, trace=recorder.trace)
+                    try:
+                        client.run()
+                    finally:
+                        client.close()
 
             # Sort out delays if necessary
             if args.delay_mode == "fixed":
@@ -0,0 +1,132 @@
+import os
+import time
+import argparse
+from colorama import Fore
+from typing import Any, Optional
+
+from logger import ColorLogger
+from config import CompressionConfig
+from benchmark import BenchmarkServer, Case, build_pool, measure, summarize, host_info, write_json
+from payload import COMPRESSION, message_limit
+
+# Get logging
+logger = ColorLogger("gRPC Compression")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def process_cpu(pid:int) -> Optional[float]:
+    # User plus system CPU seconds of another process, from /proc on Linux
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def loopback_bytes() -> Optional[int]:
+    # Bytes sent on the loopback interface, which is every byte on the wire in both directions
+    try:
+        with open("/proc/net/dev") as f:
+            for line in f:
+                name, _, counters = line.partition(":")
+                if name.strip() == "lo":
+                    return int(counters.split()[8])
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+class Usage:
+    """
+    CPU and loopback counters at one moment.  Client CPU is this whole process, so the load generator's
+    own overhead is in it too and only the differences between settings are meaningful.
+    """
+    def __init__(self, server_pid:int):
+        self.client_cpu = time.process_time()
+        self.server_cpu = process_cpu(server_pid)
+        self.wire = loopback_bytes()
+
+    def since(self, before:"Usage", count:int) -> dict[str, Any]:
+        per_rpc = lambda after, start, scale: round((after - start) * scale / count, 1) if None not in (after, start) and count else None
+        return {"wire_bytes_per_rpc": per_rpc(self.wire, before.wire, 1),
+                "client_cpu_us_per_rpc": per_rpc(self.client_cpu, before.client_cpu, 1e6),
+                "server_cpu_us_per_rpc": per_rpc(self.server_cpu, before.server_cpu, 1e6)}
+
+
+def run_setting(case:Case, args:Any, algorithm:str, port:int) -> dict[str, Any]:
+    """
+    One algorithm at one compressibility on its own server.  Requests are compressed by the client's
+    channels, responses by the server's default, as --direction asks.
+    """
+    limit = message_limit(case.size)
+    requests = algorithm if args.direction in ("both", "requests") else "none"
+    responses = algorithm if args.direction in ("both", "responses") else "none"
+    extra = ["--compression", responses, "--compressibility", str(case.compressibility)]
+
+    with BenchmarkServer(port, case.type, case.secure, args.engine, 1, limit, extra) as server:
+        pool = build_pool(args, port, case.secure, limit, compression=COMPRESSION[requests])
+        try:
+            if not pool.connect(10.0) or not server.running:
+                reason = "server exited" if not server.running else "could not connect"
+                logger.error(f"Skipping {case.name}: {reason}")
+                return {"skipped": reason}
+
+            logger.info(f"Running {case.name} for {args.duration:.0f}s")
+            if args.warmup > 0:
+                measure(case, args, pool, args.warmup)
+
+            before = Usage(server.process.pid)
+            recorder, throughput, errors = measure(case, args, pool, args.duration)
+            usage = Usage(server.process.pid).since(before, recorder.latency.overall().count + errors)
+        finally:
+            pool.close()
+
+    result = summarize(case, recorder, throughput, errors)
+    result.update(usage)
+    if case.size and usage["wire_bytes_per_rpc"] is not None:
+        result["wire_ratio"] = round(usage["wire_bytes_per_rpc"] / (2 * case.size), 3)
+    return result
+
+
+def report(results:dict[str, Any]):
+    value = lambda v, spec: format(v, spec) if v is not None else "n/a"
+    logger.log(f"  {'setting':<16} {'throughput':>11} {'p99 ms':>8} {'wire KB/rpc':>12} {'ratio':>6} "
+               f"{'client us/rpc':>14} {'server us/rpc':>14}", color=Fore.CYAN)
+    for name, r in results.items():
+        if "skipped" in r:
+            logger.warning(f"  {name:<16} skipped: {r['skipped']}")
+            continue
+        wire = r["wire_bytes_per_rpc"] / 1024 if r["wire_bytes_per_rpc"] is not None else None
+        logger.log(f"  {name:<16} {r['throughput']:>11.1f} {r['p99_ms']:>8.2f} {value(wire, '>12.2f')} "
+                   f"{value(r.get('wire_ratio'), '>6.2f')} {value(r['client_cpu_us_per_rpc'], '>14.1f')} "
+                   f"{value(r['server_cpu_us_per_rpc'], '>14.1f')}", color=Fore.YELLOW if r["errors"] else Fore.WHITE)
+
+
+def main():
+    cc = CompressionConfig( argparse.ArgumentParser(description="gRPC compression trade-off report"), logger )
+    args = cc.get_args()
+
+    if loopback_bytes() is None:
+        logger.warning("No loopback counters in /proc/net/dev, wire bytes and server CPU won't be reported")
+
+    results = {}
+    try:
+        for i, (compressibility, algorithm) in enumerate((c, a) for c in cc.compressibility for a in cc.algorithms):
+            case = Case(f"{algorithm}@{compressibility:g}", args.type, args.secure, args.size, compressibility)
+            results[case.name] = run_setting(case, args, algorithm, args.port + i)
+    except KeyboardInterrupt:
+        logger.log("Report interrupted by user. Writing the settings that finished...", color=Fore.MAGENTA)
+
+    logger.log(f"{args.size} byte payloads each way, compressing {args.direction}:", color=Fore.CYAN)
+    report(results)
+
+    write_json(args.output, {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": host_info(),
+                             "settings": {k: getattr(args, k) for k in ("type", "size", "direction", "duration", "workers", "inflight", "engine")},
+                             "results": results})
+    logger.info(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,54 @@
 
 import os
+import json
 import argparse
 from argparse import ArgumentParser
 from colorama import Fore
 from typing import Any
 
 from logger import ColorLogger
+from faults import FaultProfile
+from replay import read_header
 
 
 class ConfigGeneralException(Exception):
     pass
 
 
+def parse_size(value:str) -> int:
+    """
+    Byte size from the command line: a plain number or one with a K, M or G (binary) suffix, e.g. 64K.
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = value.strip().upper().removesuffix("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {value}")
+
+
+def parse_option(value:str) -> tuple[str, Any]:
+    """
+    gRPC channel argument from the command line as KEY=VALUE, e.g. grpc.keepalive_time_ms=10000.  Whole
+    number values are passed as integers, anything else as a string.
+    """
+    key, sep, text = value.partition("=")
+    key, text = key.strip(), text.strip()
+    if not sep or not key.startswith("grpc."):
+        raise argparse.ArgumentTypeError(f"invalid option '{value}', expected grpc.KEY=VALUE")
+    try:
+        return key, int(text)
+    except ValueError:
+        return key, text
+
+
 class BaseConfig:
     def __init__(self, parser: ArgumentParser, log:ColorLogger):
         self.log = log
         log.info("BaseConfig init")
-        parser.add_argument("--type", type=str, choices=["unary", "bidirectional"], default="unary", help="Type of gRPC service to run: 'unary' or 'bidirectional'")
+        parser.add_argument("--type", type=str, choices=["unary", "bidirectional", "server-streaming", "client-streaming"], default="unary", help="Type of gRPC service to run: 'unary', 'bidirectional', 'server-streaming' (one request, a stream of replies) or 'client-streaming' (a stream of requests, one reply)")
         parser.add_argument("--secure", action="store_true", required=False, help="Use secure gRPC channel with SSL/TLS")
         parser.add_argument("--port", type=int, default=50051, help="Port to bind to (server) or connect on (client)")
 
@@ -50,12 +82,62 @@ class ServerConfig(BaseConfig):
         log.info("ServerConfig init")
 
         parser.add_argument("--ip", type=str, help="IP address to bind to")
+        parser.add_argument("--engine", type=str, choices=["threaded", "aio"], help="Server engine: 'threaded' (thread pool) or 'aio' (asyncio event loop)")
+        parser.add_argument("--max-workers", type=int, default=10, help="Thread pool size (used if engine is 'threaded')")
+        parser.add_argument("--workers", type=int, help="Number of server processes sharing ip:port through SO_REUSEPORT")
+        parser.add_argument("--max-message-size", type=parse_size, default="16M", help="Largest message the server sends or accepts, e.g. 4M.  Payloads up to this size less 64K can be requested")
+        parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics over HTTP on this port, 0 for off.  With --workers, worker N uses this port + N")
+        parser.add_argument("--grace", type=float, default=10.0, help="Seconds in-flight rpcs get to finish when the server stops or drains")
+        parser.add_argument("--drain-delay", type=float, default=5.0, help="Seconds a draining server (SIGUSR1) keeps serving as NOT_SERVING, so health monitors notice, before it stops")
+        parser.add_argument("--compression", type=str, choices=["none", "deflate", "gzip"], default="none", help="Compress every response with this algorithm, clients that don't accept it get them uncompressed")
+        parser.add_argument("--compressibility", type=float, default=0.0, help="Fraction of each response payload that is repeated text rather than random bytes, 0 (incompressible) to 1")
+        parser.add_argument("--grpc-option", type=parse_option, action="append", default=[], metavar="KEY=VALUE", help="gRPC server option, e.g. grpc.max_concurrent_streams=100 or grpc.http2.max_frame_size=65536.  Repeat for more than one")
+        parser.add_argument("--faults", type=str, help="JSON fault profile (delays, error rates, stream stalls) to inject, reloaded whenever the file changes")
+        parser.add_argument("--log-level", type=str, choices=["debug", "info", "warning", "error"], default="debug", help="Lowest level of log line to write")
+        parser.add_argument("--log-sample", type=int, default=1, help="Log 1 in N requests (1 logs every request)")
+        parser.add_argument("--no-request-log", action="store_true", required=False, help="Turn per-request log lines off entirely")
 
         self.args = self.parse_cmd_args(parser)
         
         self.ip = self.args.ip or os.getenv("GRPC_SERVER_IP", "0.0.0.0")
         self.port = self.args.port or int(os.getenv("GRPC_SERVER_PORT", "50051"))
         self.type = self.args.type or os.getenv("GRPC_SERVICE_TYPE", "unary").lower()
+        self.engine = self.args.engine or os.getenv("GRPC_SERVER_ENGINE", "threaded").lower()
+
+        if self.engine not in ("threaded", "aio"):
+            log.error(f"Invalid server engine: {self.engine}")
+            exit(1)
+        self.workers = self.args.workers or int(os.getenv("GRPC_SERVER_WORKERS", "1"))
+        self.metrics_port = self.args.metrics_port or int(os.getenv("GRPC_METRICS_PORT", "0"))
+        self.faults = self.args.faults or os.getenv("GRPC_FAULTS_FILE", "")
+
+        if self.workers < 1:
+            log.error("Server workers must be at least 1.")
+            exit(1)
+        if not (0 <= self.metrics_port <= 65535 - (self.workers - 1)):
+            log.error("Metrics port must be between 0 and 65535, with room for every worker.")
+            exit(1)
+        if self.args.max_message_size <= 64 * 1024:
+            log.error("Max message size must be over 64K.")
+            exit(1)
+        if self.args.log_sample < 1:
+            log.error("Log sample must be at least 1, use --no-request-log to turn request lines off.")
+            exit(1)
+        if self.args.max_workers < 1:
+            log.error("Max workers must be at least 1.")
+            exit(1)
+        if self.args.grace < 0 or self.args.drain_delay < 0:
+            log.error("Grace period and drain delay cannot be negative.")
+            exit(1)
+        if not 0 <= self.args.compressibility <= 1:
+            log.error("Compressibility must be between 0 and 1.")
+            exit(1)
+        if self.faults:
+            try:
+                FaultProfile.load(self.faults)
+            except (OSError, ValueError) as e:
+                log.error(f"Invalid fault profile {self.faults}: {e}")
+                exit(1)
 
 
     def get_args(self) -> tuple[str, int, str]:
@@ -67,13 +149,47 @@ class ClientConfig(BaseConfig):
         super().__init__( parser, log )
         log.info("ClientConfig init")
 
-        parser.add_argument("--targets", type=str, required=True, help="Comma-separated list of server addresses (e.g., localhost:50051,localhost:50052).  If using the rebuild-tcp-each-message, only the first address:port is used.")
+        parser.add_argument("--targets", type=str, required=True, help="Comma-separated list of server addresses (e.g., grpcsvr-1,grpcsvr-2).  Calls are spread across every target.")
         parser.add_argument("--repeat", type=int, default=1, help="Number of times to loop through all targets (0 for infinite)")
         parser.add_argument("--delay-mode", choices=["fixed", "random"], default="fixed", help="Delay mode between requests: 'fixed' or 'random'")
         parser.add_argument("--delay", type=float, default=1.0, help="Fixed delay in seconds (used if delay-mode is 'fixed')")
         parser.add_argument("--random-min", type=float, default=0.5, help="Minimum random delay in seconds (used if delay-mode is 'random')")
         parser.add_argument("--random-max", type=float, default=2.0, help="Maximum random delay in seconds (used if delay-mode is 'random')")
         parser.add_argument("--rebuild-tcp-each-message", action="store_true", required=False, help="Tear down and rebuild connection for each message or message stream")
+        parser.add_argument("--channels-per-target", type=int, default=0, help="Warm channels kept open to each target, 0 picks 1 for serial, stream and streams runs and one per worker otherwise")
+        parser.add_argument("--balance", type=str, choices=["round-robin", "least-outstanding"], default="round-robin", help="How calls are spread over the pooled channels")
+        parser.add_argument("--connect-timeout", type=float, default=10.0, help="Seconds to wait for pooled channels to connect before starting")
+        parser.add_argument("--request-size", type=parse_size, default=0, help="Payload bytes sent with each request, e.g. 1K, 64K, 4M")
+        parser.add_argument("--response-size", type=parse_size, default=0, help="Payload bytes the server is asked to send back")
+        parser.add_argument("--mode", type=str, choices=["serial", "load", "open-loop", "capacity", "replay", "stream", "streams", "connect"], default="serial", help="'serial' runs one rpc per iteration with delays, 'load' runs concurrent workers as fast as possible, 'open-loop' sends at a fixed --rate whatever the response times, 'capacity' raises the open-loop rate step by step to the highest one that meets --slo-p99 and --slo-errors, 'replay' re-sends a --trace of an earlier run at --speed, 'stream' benchmarks one long-lived bidirectional stream, 'streams' holds many concurrent streams over shared channels, 'connect' opens a new connection at --rate and times connect/handshake and first rpc separately")
+        parser.add_argument("--processes", type=int, default=1, help="Client processes to run the mode in, with the results merged into one report (modes 'load' and 'open-loop')")
+        parser.add_argument("--workers", type=int, default=4, help="Number of concurrent load workers sharing the channel pool, which by default holds one channel per worker (used if mode is 'load', 'open-loop', 'capacity' or 'replay')")
+        parser.add_argument("--inflight", type=int, default=8, help="Number of in-flight rpcs kept outstanding per worker (used if mode is 'load')")
+        parser.add_argument("--rate", type=float, default=100.0, help="Target rpcs per second, the first rate of a capacity search, or new connections per second (used if mode is 'open-loop', 'capacity' or 'connect')")
+        parser.add_argument("--arrival", type=str, choices=["constant", "poisson"], default="constant", help="Spacing of open-loop sends: 'constant' or 'poisson'")
+        parser.add_argument("--search", type=str, choices=["step", "binary"], default="step", help="Capacity search: 'step' adds --rate-step until a step misses the SLO, 'binary' doubles the rate until one misses then bisects (used if mode is 'capacity')")
+        parser.add_argument("--rate-step", type=float, default=100.0, help="Rate added at each step, or the resolution a binary search stops at (used if mode is 'capacity')")
+        parser.add_argument("--max-rate", type=float, default=10000.0, help="Highest rate the capacity search tries (used if mode is 'capacity')")
+        parser.add_argument("--slo-p99", type=float, default=20.0, help="Highest p99 latency in milliseconds a step may have to meet the SLO (used if mode is 'capacity')")
+        parser.add_argument("--slo-errors", type=float, default=0.1, help="Highest percentage of failed rpcs a step may have to meet the SLO (used if mode is 'capacity')")
+        parser.add_argument("--curve", type=str, help="Write the capacity search's throughput/latency curve, capacity and knee to this JSON file (used if mode is 'capacity')")
+        parser.add_argument("--stream-rate", type=float, default=0.0, help="Messages per second on the stream (per stream in 'streams' mode), 0 for as fast as flow control allows (used if mode is 'stream' or 'streams')")
+        parser.add_argument("--streams", type=int, default=100, help="Concurrent bidirectional streams to hold open (used if mode is 'streams')")
+        parser.add_argument("--stream-count", type=int, default=0, help="Messages to send before closing the stream, 0 to run for --duration (used if mode is 'stream')")
+        parser.add_argument("--messages", type=int, default=10, help="Messages per rpc: replies of --response-size for 'server-streaming', requests of --request-size for 'client-streaming'")
+        parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between periodic latency reports, 0 to only report at the end of the run")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run the load for, 0 runs until interrupted, or the seconds each capacity step is held for")
+        parser.add_argument("--failover", action="store_true", required=False, help="Detect outages and backend changes, timing detection and recovery of each (used if mode is 'load', 'open-loop' or 'replay')")
+        parser.add_argument("--failover-window", type=float, default=1.0, help="Seconds without errors that end an outage, and without responses before a backend counts as gone")
+        parser.add_argument("--retries", type=int, default=0, help="Retry rpcs that fail UNAVAILABLE up to this many times on the next pooled channel (used if mode is 'load', 'open-loop' or 'replay')")
+        parser.add_argument("--compression", type=str, choices=["none", "deflate", "gzip"], default="none", help="Compress every request on the client's channels with this algorithm")
+        parser.add_argument("--call-compression", type=str, choices=["none", "deflate", "gzip"], help="Compression set on each rpc, overriding --compression for requests (not used by 'streams' mode)")
+        parser.add_argument("--compressibility", type=float, default=0.0, help="Fraction of each request payload that is repeated text rather than random bytes, 0 (incompressible) to 1")
+        parser.add_argument("--channel-option", type=parse_option, action="append", default=[], metavar="KEY=VALUE", help="gRPC channel option for every channel the client opens, e.g. grpc.keepalive_time_ms=10000.  Repeat for more than one")
+        parser.add_argument("--trace", type=str, help="Write a compact trace of every rpc sent (send time, type, sizes, stream length) to this file for replay, with --processes each process writes FILE.N (used if mode is 'serial', 'load', 'open-loop' or 'replay')")
+        parser.add_argument("--replay", type=str, help="Comma-separated trace files to re-send, merged onto one timeline (used if mode is 'replay')")
+        parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor, 10 sends the trace ten times faster (used if mode is 'replay')")
+        parser.add_argument("--record", type=str, help="Write a binary record of every rpc to this file for analyze.py, with --processes each process writes FILE.N (used if mode is 'load', 'open-loop' or 'replay')")
 
         self.args = self.parse_cmd_args(parser)
         
@@ -87,12 +203,287 @@ class ClientConfig(BaseConfig):
         if self.args.delay_mode == "random" and self.args.random_min > self.args.random_max:
             log.error("Random delay minimum cannot be greater than maximum.")
             exit(1)
+
+        # Validate load values
+        if self.args.workers < 1 or self.args.inflight < 1:
+            log.error("Workers and in-flight rpcs must both be at least 1.")
+            exit(1)
+        if self.args.request_size < 0 or self.args.response_size < 0:
+            log.error("Payload sizes cannot be negative.")
+            exit(1)
+        if self.args.channels_per_target < 0:
+            log.error("Channels per target cannot be negative.")
+            exit(1)
+        if self.args.rate <= 0:
+            log.error("Rate must be greater than 0.")
+            exit(1)
+        if self.args.stream_rate < 0 or self.args.stream_count < 0:
+            log.error("Stream rate and count cannot be negative.")
+            exit(1)
+        if self.args.streams < 1 or self.args.messages < 1:
+            log.error("Streams and messages per rpc must be at least 1.")
+            exit(1)
+        if self.args.processes < 1:
+            log.error("Processes must be at least 1.")
+            exit(1)
+        if self.args.processes > 1 and self.args.mode not in ("load", "open-loop"):
+            log.error("Multiple processes are only supported for the 'load' and 'open-loop' modes.")
+            exit(1)
+        if self.args.duration < 0:
+            log.error("Duration cannot be negative.")
+            exit(1)
+        if (self.args.failover or self.args.retries) and self.args.mode not in ("load", "open-loop", "replay"):
+            log.error("Failover detection and retries are only supported for the 'load', 'open-loop' and 'replay' modes.")
+            exit(1)
+        if self.args.failover and self.args.processes > 1:
+            log.error("Failover detection needs every rpc in one process, it can't be combined with --processes.")
+            exit(1)
+        if self.args.failover_window <= 0 or self.args.retries < 0:
+            log.error("Failover window must be greater than 0 and retries cannot be negative.")
+            exit(1)
+        if not 0 <= self.args.compressibility <= 1:
+            log.error("Compressibility must be between 0 and 1.")
+            exit(1)
+        if self.args.record and self.args.mode not in ("load", "open-loop", "replay"):
+            log.error("Recording every rpc is only supported for the 'load', 'open-loop' and 'replay' modes.")
+            exit(1)
+        if self.args.trace and self.args.mode not in ("serial", "load", "open-loop", "replay"):
+            log.error("Tracing is only supported for the 'serial', 'load', 'open-loop' and 'replay' modes.")
+            exit(1)
+        if self.args.mode == "capacity" and (self.args.duration <= 0 or self.args.rate_step <= 0 or self.args.max_rate < self.args.rate):
+            log.error("A capacity search needs a duration and rate step greater than 0, and --max-rate at least --rate.")
+            exit(1)
+        if self.args.slo_p99 <= 0 or self.args.slo_errors < 0:
+            log.error("The p99 SLO must be greater than 0 and the error SLO cannot be negative.")
+            exit(1)
+        if self.args.speed <= 0:
+            log.error("Replay speed must be greater than 0.")
+            exit(1)
+        if self.args.mode == "replay":
+            self._check_replay()
       
     
+    def _check_replay(self):
+        # The traces set the payload sizes, so the channels' message limits come from their largest rpcs
+        paths = [p.strip() for p in (self.args.replay or "").split(",") if p.strip()]
+        if not paths:
+            self.log.error("Replay mode needs the trace files to send in --replay.")
+            exit(1)
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            self.log.error(f"Trace files not found: {', '.join(missing)}")
+            exit(1)
+        try:
+            headers = [read_header(path) for path in paths]
+        except (OSError, ValueError) as e:
+            self.log.error(f"Could not read the trace headers: {e}")
+            exit(1)
+
+        unknown = {t for header in headers for t in header["types"]} - {"unary", "bidirectional", "server-streaming", "client-streaming"}
+        if unknown:
+            self.log.error(f"Traces hold rpc types this client can't send: {', '.join(sorted(unknown))}")
+            exit(1)
+        self.args.replay = paths
+        self.args.request_size = max(header["max_request_size"] for header in headers)
+        self.args.response_size = max(header["max_response_size"] for header in headers)
+
     def get_args(self) -> Any:
         return self.args 
 
 
+class BenchmarkConfig(BaseConfig):
+    def __init__(self, parser: ArgumentParser, log:ColorLogger):
+        # Each case picks its own service type and security, so the shared --type/--secure don't apply
+        self.log = log
+        log.info("BenchmarkConfig init")
+
+        parser.add_argument("--cases", type=str, default="unary,stream,tls,sizes", help="Comma-separated cases to run: unary, stream, tls (unary and stream over TLS) and sizes (unary payload sweep)")
+        parser.add_argument("--sizes", type=str, default="1K,16K,64K,256K,1M", help="Comma-separated payload sizes for the sizes sweep, sent and returned by each rpc")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds each case is measured for")
+        parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of unmeasured load before each case")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent client load workers, sharing a pool of one channel per worker")
+        parser.add_argument("--inflight", type=int, default=8, help="In-flight rpcs per worker, or unanswered messages on the stream")
+        parser.add_argument("--engine", type=str, choices=["threaded", "aio"], default="threaded", help="Engine of the benchmarked servers")
+        parser.add_argument("--server-workers", type=int, default=1, help="Processes per benchmarked server")
+        parser.add_argument("--port", type=int, default=50100, help="First loopback port the benchmark servers bind to")
+        parser.add_argument("--tls-server-name", type=str, default="grpcsvr-1", help="Name in the server certificate that TLS cases verify against")
+        parser.add_argument("--output", type=str, default="benchmark-results.json", help="File the results are written to")
+        parser.add_argument("--baseline", type=str, default="benchmark-baseline.json", help="Baseline results to compare against, if the file exists")
+        parser.add_argument("--save-baseline", action="store_true", required=False, help="Also write the results to --baseline, replacing it")
+        parser.add_argument("--threshold", type=float, default=10.0, help="Percent change against the baseline that counts as a regression")
+
+        self.args = self.parse_cmd_args(parser)
+
+        self.cases = [c.strip() for c in self.args.cases.split(",") if c.strip()]
+        unknown = set(self.cases) - {"unary", "stream", "tls", "sizes"}
+        if unknown:
+            log.error(f"Unknown benchmark cases: {', '.join(sorted(unknown))}")
+            exit(1)
+        try:
+            self.sizes = [parse_size(size) for size in self.args.sizes.split(",") if size.strip()]
+        except argparse.ArgumentTypeError as e:
+            log.error(f"Invalid --sizes: {e}")
+            exit(1)
+
+        if self.args.duration <= 0 or self.args.warmup < 0:
+            log.error("Duration must be greater than 0 and warmup cannot be negative.")
+            exit(1)
+        if self.args.workers < 1 or self.args.inflight < 1 or self.args.server_workers < 1:
+            log.error("Workers, in-flight rpcs and server workers must all be at least 1.")
+            exit(1)
+        if self.args.threshold <= 0:
+            log.error("Regression threshold must be greater than 0.")
+            exit(1)
+
+    def get_args(self) -> Any:
+        return self.args
+
+
+class SweepConfig(BaseConfig):
+    # Server settings that are server.py arguments rather than gRPC options
+    SERVER_SETTINGS = ("engine", "workers", "max_workers")
+
+    def __init__(self, parser: ArgumentParser, log:ColorLogger):
+        super().__init__( parser, log )
+        log.info("SweepConfig init")
+
+        parser.add_argument("matrix", type=str, help="JSON file of the server and channel option values to sweep, every combination is run")
+        parser.add_argument("--target", type=str, help="Sweep channel options against this server or proxy instead of loopback servers, the matrix can't have server options then")
+        parser.add_argument("--size", type=parse_size, default=0, help="Payload bytes sent and returned by each rpc or message")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds each combination is measured for")
+        parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of unmeasured load before each combination")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent client load workers, sharing a pool of one channel per worker")
+        parser.add_argument("--inflight", type=int, default=8, help="In-flight rpcs per worker, or unanswered messages on the stream")
+        parser.add_argument("--engine", type=str, choices=["threaded", "aio"], default="threaded", help="Engine of the loopback servers, unless the matrix sweeps it")
+        parser.add_argument("--server-workers", type=int, default=1, help="Processes per loopback server, unless the matrix sweeps 'workers'")
+        parser.add_argument("--tls-server-name", type=str, help="Name in the server certificate to verify against, grpcsvr-1 for loopback servers")
+        parser.add_argument("--rank", type=str, choices=["throughput", "p99"], default="throughput", help="Order of the results table: highest throughput or lowest p99 first")
+        parser.add_argument("--output", type=str, default="sweep-results.json", help="File the ranked results are written to")
+        parser.set_defaults(port=50200)
+
+        self.args = self.parse_cmd_args(parser)
+
+        try:
+            with open(self.args.matrix) as f:
+                matrix = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.error(f"Could not read the sweep matrix {self.args.matrix}: {e}")
+            exit(1)
+        if not isinstance(matrix, dict) or set(matrix) - {"server", "channel"}:
+            log.error("The sweep matrix must be an object with 'server' and/or 'channel' keys.")
+            exit(1)
+
+        self.server = self._values(matrix.get("server") or {}, self.SERVER_SETTINGS)
+        self.channel = self._values(matrix.get("channel") or {}, ())
+        if "engine" in self.server and set(self.server["engine"]) - {"threaded", "aio"}:
+            log.error("Server engine values must be 'threaded' or 'aio'.")
+            exit(1)
+        if self.args.target and self.server:
+            log.error("Server options can only be swept on loopback servers, leave --target out or the 'server' matrix empty.")
+            exit(1)
+        if not self.args.target and self.args.secure and not self.args.tls_server_name:
+            self.args.tls_server_name = "grpcsvr-1"
+
+        if self.args.duration <= 0 or self.args.warmup < 0:
+            log.error("Duration must be greater than 0 and warmup cannot be negative.")
+            exit(1)
+        if self.args.workers < 1 or self.args.inflight < 1 or self.args.server_workers < 1:
+            log.error("Workers, in-flight rpcs and server workers must all be at least 1.")
+            exit(1)
+
+    def _values(self, options:Any, settings:tuple[str, ...]) -> dict[str, list[Any]]:
+        # Each option maps to a non-empty list of whole numbers or strings
+        if not isinstance(options, dict):
+            self.log.error("Sweep matrix 'server' and 'channel' must be objects of option: [values].")
+            exit(1)
+        for key, values in options.items():
+            if not key.startswith("grpc.") and key not in settings:
+                self.log.error(f"Unknown option '{key}' in the sweep matrix, options start with grpc.")
+                exit(1)
+            if not isinstance(values, list) or not values or \
+               any(isinstance(v, bool) or not isinstance(v, (int, str)) for v in values):
+                self.log.error(f"Sweep matrix '{key}' must be a list of whole numbers or strings.")
+                exit(1)
+        return options
+
+    def get_args(self) -> Any:
+        return self.args
+
+
+class CompressionConfig(BaseConfig):
+    def __init__(self, parser: ArgumentParser, log:ColorLogger):
+        super().__init__( parser, log )
+        log.info("CompressionConfig init")
+
+        parser.add_argument("--algorithms", type=str, default="none,deflate,gzip", help="Comma-separated compression settings to compare: none, deflate and gzip")
+        parser.add_argument("--compressibility", type=str, default="0,0.5,0.9", help="Comma-separated payload compressibility values, the fraction of each payload that is repeated text")
+        parser.add_argument("--direction", type=str, choices=["both", "requests", "responses"], default="both", help="Compress requests (client channels), responses (server) or both")
+        parser.add_argument("--size", type=parse_size, default="64K", help="Payload bytes sent and returned by each rpc or message")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds each setting is measured for")
+        parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of unmeasured load before each setting")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent client load workers, sharing a pool of one channel per worker")
+        parser.add_argument("--inflight", type=int, default=8, help="In-flight rpcs per worker, or unanswered messages on the stream")
+        parser.add_argument("--engine", type=str, choices=["threaded", "aio"], default="threaded", help="Engine of the loopback servers")
+        parser.add_argument("--tls-server-name", type=str, default="grpcsvr-1", help="Name in the server certificate that --secure runs verify against")
+        parser.add_argument("--output", type=str, default="compression-results.json", help="File the results are written to")
+        parser.set_defaults(port=50300)
+
+        self.args = self.parse_cmd_args(parser)
+
+        self.algorithms = [a.strip() for a in self.args.algorithms.split(",") if a.strip()]
+        unknown = set(self.algorithms) - {"none", "deflate", "gzip"}
+        if unknown or not self.algorithms:
+            log.error(f"Unknown compression algorithms: {', '.join(sorted(unknown)) or 'none given'}")
+            exit(1)
+        try:
+            self.compressibility = [float(c) for c in self.args.compressibility.split(",") if c.strip()]
+        except ValueError as e:
+            log.error(f"Invalid --compressibility: {e}")
+            exit(1)
+        if not self.compressibility or any(not 0 <= c <= 1 for c in self.compressibility):
+            log.error("Compressibility values must be between 0 and 1.")
+            exit(1)
+
+        if self.args.duration <= 0 or self.args.warmup < 0:
+            log.error("Duration must be greater than 0 and warmup cannot be negative.")
+            exit(1)
+        if self.args.workers < 1 or self.args.inflight < 1:
+            log.error("Workers and in-flight rpcs must both be at least 1.")
+            exit(1)
+
+    def get_args(self) -> Any:
+        return self.args
+
+
+class AnalyzeConfig(BaseConfig):
+    def __init__(self, parser: ArgumentParser, log:ColorLogger):
+        # Works on recorded files only, the shared connection arguments don't apply
+        self.log = log
+        log.info("AnalyzeConfig init")
+
+        parser.add_argument("files", nargs="+", help="Files written by client.py --record, e.g. every FILE.N of a --processes run")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds per row of the throughput and percentile time series")
+        parser.add_argument("--csv", type=str, help="Write the time series to this CSV file instead of the console")
+        parser.add_argument("--bursts", type=int, default=20, help="Most error bursts to list, largest first")
+        parser.add_argument("--chunk", type=int, default=16 * 1024 * 1024, help="Records processed per vectorized pass, bounds memory use")
+
+        self.args = self.parse_cmd_args(parser)
+
+        missing = [path for path in self.args.files if not os.path.exists(path) or not os.path.exists(path + ".json")]
+        if missing:
+            log.error(f"Recorded files or their .json headers not found: {', '.join(missing)}")
+            exit(1)
+        if self.args.interval <= 0:
+            log.error("Interval must be greater than 0.")
+            exit(1)
+        if self.args.bursts < 0 or self.args.chunk < 1:
+            log.error("Bursts cannot be negative and chunk must be at least 1.")
+            exit(1)
+
+    def get_args(self) -> Any:
+        return self.args
+
+
 ######################################################################################################
 ## For testing
 def main():
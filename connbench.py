@@ -0,0 +1,146 @@
+import time
+import threading
+import grpc
+from concurrent import futures
+from colorama import Fore
+from typing import Any, Callable
+
+from logger import ColorLogger
+from scheduler import ArrivalSchedule, wait_until
+from stats import LatencyRecorder, RunRecorder
+
+
+class ConnectionStats:
+    """
+    Counters for connection attempts.  Attempts finish on executor threads so updates go through the lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.attempted = 0
+        self.connected = 0
+        self.connect_failed = 0
+        self.rpc_failed = 0
+
+    def record(self, connected:bool, rpc_ok:bool = False):
+        with self.lock:
+            self.attempted += 1
+            if not connected:
+                self.connect_failed += 1
+            else:
+                self.connected += 1
+                if not rpc_ok:
+                    self.rpc_failed += 1
+
+
+class ConnectionBenchmark:
+    """
+    Connection setup rate: a brand new channel every 1/rate seconds, spread round-robin over the targets.
+
+    Each attempt times the connect phase on its own, the TCP connect and any TLS handshake until
+    channel_ready_future fires, then runs one rpc on the fresh connection and times that separately before
+    closing the channel.  Credentials are loaded once and shared, so the file and credential setup
+    never land in the measurement.  Up to `max_inflight` attempts run at once.
+    """
+    def __init__(self, targets:list[str], client_factory:Callable[[str], Any], log:ColorLogger, recorder:RunRecorder,
+                 rate:float, duration:float = 10.0, max_inflight:int = 32, connect_timeout:float = 10.0):
+        self.targets = targets
+        self.client_factory = client_factory
+        self.log = log
+        self.recorder = recorder
+        self.rate = rate
+        self.duration = duration
+        self.max_inflight = max_inflight
+        self.connect_timeout = connect_timeout
+        self.connect = LatencyRecorder("Connect latency")
+        self.stats = ConnectionStats()
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.max_lag = 0.0
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self._last = (0.0, 0)
+
+    def _attempt(self, target:str):
+        try:
+            # Building the client isn't part of the connect, the clock starts as the channel is asked to connect
+            client = self.client_factory(target)
+            try:
+                if client.channel is None:
+                    self.stats.record(False)
+                    return
+
+                start = time.perf_counter()
+                try:
+                    grpc.channel_ready_future(client.channel).result(timeout=self.connect_timeout)
+                except grpc.FutureTimeoutError:
+                    self.stats.record(False)
+                    return
+
+                connected = time.perf_counter()
+                self.connect.record(target, connected - start)
+
+                try:
+                    _, result = client.call()
+                except Exception as e:
+                    # Anything the first rpc raises is its failure, not the executor's
+                    if not isinstance(e, grpc.RpcError):
+                        self.log.error(f"First rpc to {target} failed: {e!r}")
+                    self.stats.record(True, False)
+                    self.recorder.record_error()
+                    return
+
+                self.recorder.record(target, time.perf_counter() - connected, client.backend_of(result))
+                self.stats.record(True, True)
+            finally:
+                client.close()
+        finally:
+            self.slots.release()
+
+    def run(self):
+        self.log.info(f"Starting connection benchmark: {self.rate:.1f} new connections/s over {len(self.targets)} targets")
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="connect")
+        schedule = ArrivalSchedule(self.rate)
+        end = schedule.start + self.duration if self.duration > 0 else float("inf")
+        self.start_time = schedule.start
+        self._last = (self.start_time, 0)
+
+        try:
+            while True:
+                intended = schedule.next()
+                if intended >= end:
+                    break
+
+                wait_until(intended)
+                self.slots.acquire()
+                self.max_lag = max(self.max_lag, time.perf_counter() - intended)
+                executor.submit(self._attempt, self.targets[(schedule.sent - 1) % len(self.targets)])
+
+        except KeyboardInterrupt:
+            self.log.log("Connection benchmark interrupted by user. Waiting for open attempts...", color=Fore.MAGENTA)
+
+        finally:
+            executor.shutdown(wait=True)
+            self.end_time = time.perf_counter()
+
+    def report_interval(self, log:ColorLogger, seconds:float):
+        now, stats = time.perf_counter(), self.stats
+        last_time, last_connected = self._last
+        self._last = (now, stats.connected)
+
+        log.log(f"Connections: {(stats.connected - last_connected) / max(now - last_time, 1e-9):.1f}/s, "
+                f"{stats.connect_failed} failed to connect", color=Fore.CYAN)
+        self.connect.report_interval(log, seconds)
+
+    def report(self):
+        stats = self.stats
+        elapsed = max((self.end_time or time.perf_counter()) - self.start_time, 1e-9)
+        color = Fore.GREEN if stats.connect_failed == 0 and stats.rpc_failed == 0 else Fore.YELLOW
+
+        self.log.log(f"Opened {stats.connected} of {stats.attempted} connections in {elapsed:.2f}s: "
+                     f"{stats.connected / elapsed:.1f} connections/s achieved of {self.rate:.1f} offered", color=color)
+        self.log.log(f"  {stats.connect_failed} failed to connect within {self.connect_timeout:.0f}s, "
+                     f"{stats.rpc_failed} first rpcs failed", color=color)
+        if self.max_lag > 0.01:
+            self.log.warning(f"New connections fell up to {self.max_lag * 1000:.1f}ms behind schedule "
+                             f"(more than {self.max_inflight} attempts open or client CPU)")
+        if stats.connected:
+            self.connect.report(self.log)
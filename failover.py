@@ -0,0 +1,130 @@
+import time
+import threading
+from colorama import Fore
+from typing import Optional
+
+from logger import ColorLogger
+
+
+class FailoverEvent:
+    """
+    One outage as the client saw it.  Times are perf_counter seconds.
+
+    started:   send time of the first rpc that failed (or needed a retry)
+    detected:  when that rpc came back failed, so detected - started is the time to detect
+    recovered: completion of the first good rpc sent after the last failure, recovered - detected is the
+               time to recover
+    """
+    def __init__(self, started:float, detected:float, backends_before:set[str]):
+        self.started = started
+        self.detected = detected
+        self.last_error_sent = started
+        self.last_error = detected
+        self.recovered:Optional[float] = None
+        self.failed = 0
+        self.retried = 0
+        self.backends_before = backends_before
+        self.backends_after:set[str] = set()
+
+
+class FailoverDetector:
+    """
+    Finds outages and backend-set changes from every rpc the load modes complete.
+
+    Any failed or retried rpc opens an event, and it closes once `window` seconds pass with no more
+    failures and a good rpc has come back.  Backends are tracked from the identity in each response: one
+    seen for the first time after the first window has joined, and one not seen for `window` seconds has
+    left.  A backend that leaves without errors, e.g. a drained server the proxy stopped sending to, shows
+    up as a change with no event.
+    """
+    def __init__(self, log:ColorLogger, window:float = 1.0):
+        self.log = log
+        self.window = window
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.current:Optional[FailoverEvent] = None
+        self.events:list[FailoverEvent] = []
+        self.last_seen:dict[str, float] = {}
+        self.changes:list[tuple[float, str, str]] = []
+        self._next_check = self.start + window
+
+    def _at(self, t:float) -> str:
+        return f"{t - self.start:.3f}s"
+
+    def _active(self, since:float) -> set[str]:
+        return {backend for backend, seen in self.last_seen.items() if seen >= since}
+
+    def record(self, sent:float, done:float, ok:bool, backend:Optional[str] = None, retries:int = 0):
+        with self.lock:
+            if ok and backend:
+                if backend not in self.last_seen and done - self.start > self.window:
+                    self._change(done, backend, "joined")
+                self.last_seen[backend] = done
+
+            event = self.current
+            if not ok or retries:
+                if event is None:
+                    event = self.current = FailoverEvent(sent, done, self._active(done - self.window))
+                    self.log.warning(f"Outage started at {self._at(sent)}, first failure back after {(done - sent) * 1000:.1f}ms")
+                event.failed += not ok
+                event.retried += bool(retries)
+                event.last_error_sent = max(event.last_error_sent, sent)
+                event.last_error = max(event.last_error, done)
+                event.recovered = None
+            elif event is not None and event.recovered is None and sent >= event.last_error_sent:
+                event.recovered = done
+
+            if done >= self._next_check:
+                self._check(done)
+
+    def _change(self, t:float, backend:str, what:str):
+        self.changes.append((t, backend, what))
+        self.log.warning(f"Backend {backend} {what} at {self._at(t)}")
+
+    def _check(self, now:float):
+        # Backends gone quiet have left
+        self._next_check = now + self.window / 10
+        for backend, seen in list(self.last_seen.items()):
+            if now - seen > self.window:
+                del self.last_seen[backend]
+                self._change(seen, backend, "left")
+        self._close(now)
+
+    def _close(self, now:float):
+        # A recovered event closes once the window passes error free
+        event = self.current
+        if event is not None and event.recovered is not None and now - event.last_error >= self.window:
+            event.backends_after = self._active(event.recovered)
+            self.events.append(event)
+            self.current = None
+            self._log_event(event)
+
+    def _log_event(self, event:FailoverEvent):
+        lost = ", ".join(sorted(event.backends_before - event.backends_after)) or "none"
+        gained = ", ".join(sorted(event.backends_after - event.backends_before)) or "none"
+        self.log.warning(f"Outage from {self._at(event.started)}: detected in {(event.detected - event.started) * 1000:.1f}ms, "
+                         f"recovered {(event.recovered - event.detected) * 1000:.1f}ms later, {event.failed} rpcs failed, "
+                         f"{event.retried} retried, backends lost: {lost}, gained: {gained}")
+
+    def finish(self):
+        # Close out whatever is still open at the end of the run
+        with self.lock:
+            self._close(float("inf"))
+            if self.current is not None:
+                self.events.append(self.current)
+                self.current = None
+
+    def report(self):
+        color = Fore.GREEN if not self.events else Fore.YELLOW
+        self.log.log(f"Failover: {len(self.events)} outages, {len(self.changes)} backend changes", color=color)
+        for i, event in enumerate(self.events, 1):
+            detect = (event.detected - event.started) * 1000
+            if event.recovered is None:
+                self.log.warning(f"  #{i} at {self._at(event.started)}: detected in {detect:.1f}ms, not recovered by the end of the run, "
+                                 f"{event.failed} failed, {event.retried} retried")
+            else:
+                self.log.warning(f"  #{i} at {self._at(event.started)}: detected in {detect:.1f}ms, recovered in "
+                                 f"{(event.recovered - event.detected) * 1000:.1f}ms, outage {(event.recovered - event.started) * 1000:.1f}ms, "
+                                 f"{event.failed} failed, {event.retried} retried")
+        for t, backend, what in self.changes:
+            self.log.log(f"  {self._at(t)}: {backend} {what}", color=Fore.CYAN)
@@ -0,0 +1,224 @@
+import os
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+import grpc
+from typing import Any, Callable, Optional
+
+from logger import ColorLogger
+
+DELAY_KINDS = ("none", "fixed", "uniform", "lognormal", "bimodal")
+
+
+class FaultProfile:
+    """
+    What a backend injects, read from a JSON document such as:
+
+        {"delay":  {"dist": "lognormal", "median_ms": 5, "sigma": 0.8},
+         "errors": {"UNAVAILABLE": 0.01, "RESOURCE_EXHAUSTED": 0.002},
+         "stall":  {"every_s": 30, "for_s": 2}}
+
+    Delays are one of fixed (ms), uniform (min_ms, max_ms), lognormal (median_ms, sigma) or bimodal
+    (fast_ms, slow_ms, slow_fraction).  Error rates are fractions of rpcs, or of streams when they open,
+    failed with that status.  A stall pauses every stream's replies for for_s seconds once every every_s
+    seconds, each stream at its own random phase.  Anything left out injects nothing.
+    """
+    def __init__(self, data:dict[str, Any] = None):
+        data = data or {}
+        unknown = set(data) - {"delay", "errors", "stall"}
+        if unknown:
+            raise ValueError(f"unknown fault settings: {', '.join(sorted(unknown))}")
+
+        self.delay = dict(data.get("delay") or {"dist": "none"})
+        self.kind = self.delay.get("dist", "none")
+        if self.kind not in DELAY_KINDS:
+            raise ValueError(f"unknown delay distribution '{self.kind}', choose from {', '.join(DELAY_KINDS)}")
+        self._draw_delay = self._delay_sampler()
+
+        # Cumulative rates so one random number picks the status
+        self.errors:list[tuple[float, grpc.StatusCode]] = []
+        total = 0.0
+        for name, rate in (data.get("errors") or {}).items():
+            code = getattr(grpc.StatusCode, str(name).upper(), None)
+            if code is None or code == grpc.StatusCode.OK:
+                raise ValueError(f"'{name}' is not a gRPC error status")
+            if not 0 <= float(rate) <= 1:
+                raise ValueError(f"error rate for {name} must be between 0 and 1")
+            total += float(rate)
+            self.errors.append((total, code))
+        if total > 1:
+            raise ValueError("error rates add up to more than 1")
+
+        stall = data.get("stall") or {}
+        self.stall_every = float(stall.get("every_s", 0))
+        self.stall_for = float(stall.get("for_s", 0))
+        if self.stall_every < 0 or not 0 <= self.stall_for <= self.stall_every:
+            raise ValueError("stall for_s must be between 0 and every_s")
+
+    def _param(self, name:str) -> float:
+        try:
+            value = float(self.delay[name])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{self.kind} delay needs a numeric '{name}'")
+        if value < 0:
+            raise ValueError(f"delay '{name}' cannot be negative")
+        return value
+
+    def _delay_sampler(self) -> Callable[[], float]:
+        # Returns a function drawing one delay in seconds
+        if self.kind == "fixed":
+            delay = self._param("ms") / 1000
+            return lambda: delay
+        if self.kind == "uniform":
+            low, high = self._param("min_ms") / 1000, self._param("max_ms") / 1000
+            if low > high:
+                raise ValueError("uniform delay min_ms is greater than max_ms")
+            return lambda: random.uniform(low, high)
+        if self.kind == "lognormal":
+            median, sigma = self._param("median_ms") / 1000, self._param("sigma")
+            if median <= 0:
+                raise ValueError("lognormal delay median_ms must be greater than 0")
+            mu = math.log(median)
+            return lambda: random.lognormvariate(mu, sigma)
+        if self.kind == "bimodal":
+            fast, slow, fraction = self._param("fast_ms") / 1000, self._param("slow_ms") / 1000, self._param("slow_fraction")
+            if fraction > 1:
+                raise ValueError("bimodal slow_fraction must be between 0 and 1")
+            return lambda: slow if random.random() < fraction else fast
+        return lambda: 0.0
+
+    @classmethod
+    def load(cls, path:str) -> "FaultProfile":
+        with open(path) as f:
+            try:
+                return cls(json.load(f))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"invalid JSON: {e}")
+
+    def draw_delay(self) -> float:
+        return self._draw_delay()
+
+    def draw_error(self) -> Optional[grpc.StatusCode]:
+        if not self.errors:
+            return None
+        r = random.random()
+        for bound, code in self.errors:
+            if r < bound:
+                return code
+        return None
+
+    def stall_wait(self, age:float) -> float:
+        # Seconds left in the stall a stream `age` seconds into its cycle is in, 0 if it isn't stalled
+        if self.stall_for <= 0:
+            return 0.0
+        position = age % self.stall_every
+        return self.stall_for - position if position < self.stall_for else 0.0
+
+    def describe(self) -> str:
+        parts = []
+        if self.kind != "none":
+            parts.append(f"{self.kind} delay " + ", ".join(f"{k}={v}" for k, v in self.delay.items() if k != "dist"))
+        if self.errors:
+            previous, rates = 0.0, []
+            for bound, code in self.errors:
+                rates.append(f"{code.name} {100 * (bound - previous):g}%")
+                previous = bound
+            parts.append("errors " + ", ".join(rates))
+        if self.stall_for > 0:
+            parts.append(f"stall {self.stall_for:g}s every {self.stall_every:g}s")
+        return "; ".join(parts) or "nothing"
+
+
+class FaultInjector:
+    """
+    Injects the profile in a JSON file into every rpc, and reloads it whenever the file changes so a
+    running backend can be made slow or flaky without a restart.  A file that fails to load is logged
+    and the previous profile kept.
+
+    Handlers are wrapped at registration like the metrics.  On the aio engine delays are asyncio sleeps,
+    so a delayed rpc costs no capacity.  The threaded engine can only sleep the handler's thread, which
+    holds one of --max-workers for the delay.
+    """
+    def __init__(self, path:str, log:ColorLogger, poll_interval:float = 1.0):
+        self.path = path
+        self.log = log
+        self.poll_interval = poll_interval
+        self.profile = FaultProfile.load(path)
+        self._mtime = os.stat(path).st_mtime
+        self._stop = threading.Event()
+        log.info(f"Injecting faults from {path}: {self.profile.describe()}")
+        threading.Thread(target=self._watch, name="fault-watch", daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self._mtime:
+                    continue
+                self._mtime = mtime
+                self.profile = FaultProfile.load(self.path)
+                self.log.info(f"Fault profile reloaded: {self.profile.describe()}")
+            except (OSError, ValueError) as e:
+                self.log.error(f"Could not reload {self.path}, keeping the previous fault profile: {e}")
+
+    def close(self):
+        self._stop.set()
+
+    def instrument_unary(self, behavior:Callable, aio:bool = False) -> Callable:
+        def unary(request:Any, context:Any) -> Any:
+            profile = self.profile
+            delay = profile.draw_delay()
+            if delay > 0:
+                time.sleep(delay)
+            code = profile.draw_error()
+            if code is not None:
+                context.abort(code, "Injected fault")
+            return behavior(request, context)
+
+        async def unary_aio(request:Any, context:Any) -> Any:
+            profile = self.profile
+            delay = profile.draw_delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            code = profile.draw_error()
+            if code is not None:
+                await context.abort(code, "Injected fault")
+            return await behavior(request, context)
+
+        return unary_aio if aio else unary
+
+    def instrument_stream(self, behavior:Callable, aio:bool = False) -> Callable:
+        """
+        Streams draw their error once, when they open.  Every reply is held back by a delay and by the
+        stream's stall, drawn from whatever the profile is at the time.
+        """
+        def hold(started:float, phase:float) -> float:
+            profile = self.profile
+            return profile.draw_delay() + profile.stall_wait(time.monotonic() - started + phase)
+
+        def stream(request_iterator:Any, context:Any):
+            code = self.profile.draw_error()
+            if code is not None:
+                context.abort(code, "Injected fault")
+            started, phase = time.monotonic(), random.uniform(0, self.profile.stall_every)
+            for reply in behavior(request_iterator, context):
+                delay = hold(started, phase)
+                if delay > 0:
+                    time.sleep(delay)
+                yield reply
+
+        async def stream_aio(request_iterator:Any, context:Any):
+            code = self.profile.draw_error()
+            if code is not None:
+                await context.abort(code, "Injected fault")
+            started, phase = time.monotonic(), random.uniform(0, self.profile.stall_every)
+            async for reply in behavior(request_iterator, context):
+                delay = hold(started, phase)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield reply
+
+        return stream_aio if aio else stream
@@ -2,10 +2,25 @@ from . import unary_pb2 as pb2
 from . import unary_pb2_grpc as pb2_grpc
 from . import bidirectional_pb2 as bidir
 from . import bidirectional_pb2_grpc as pb2_grpc_bidir
+from . import server_streaming_pb2 as sstream
+from . import server_streaming_pb2_grpc as pb2_grpc_sstream
+from . import client_streaming_pb2 as cstream
+from . import client_streaming_pb2_grpc as pb2_grpc_cstream
+
+# Initial metadata key the server puts its hostname:pid in on every stream
+BACKEND_METADATA_KEY = "x-backend"
+
+# Trailing metadata keys for the server's handler time, and the time the rpc queued before it, in microseconds
+SERVER_TIME_KEY = "x-server-time-us"
+QUEUE_TIME_KEY = "x-queue-time-us"
 
 __all__ = [
     "unary_pb2",
     "unary_pb2_grpc",
     "bidirectional_pb2",
-    "bidirectional_pb2_grpc"
+    "bidirectional_pb2_grpc",
+    "server_streaming_pb2",
+    "server_streaming_pb2_grpc",
+    "client_streaming_pb2",
+    "client_streaming_pb2_grpc"
 ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: client_streaming.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'client_streaming.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16\x63lient_streaming.proto\x12\x0f\x63lientstreaming\"-\n\rStreamMessage\x12\x0b\n\x03seq\x18\x01 \x01(\x04\x12\x0f\n\x07payload\x18\x02 \x01(\x0c\"\x9e\x01\n\rStreamSummary\x12\x10\n\x08messages\x18\x01 \x01(\x04\x12\x16\n\x0e\x62ytes_received\x18\x02 \x01(\x04\x12\x18\n\x10\x66irst_message_us\x18\x03 \x01(\x04\x12\x13\n\x0btransfer_us\x18\x04 \x01(\x04\x12\x10\n\x08hostname\x18\x05 \x01(\t\x12\x0b\n\x03pid\x18\x06 \x01(\r\x12\x15\n\rrequest_count\x18\x07 \x01(\x04\x32j\n\x0f\x43lientStreaming\x12W\n\x11GetServerResponse\x12\x1e.clientstreaming.StreamMessage\x1a\x1e.clientstreaming.StreamSummary\"\x00(\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'client_streaming_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_STREAMMESSAGE']._serialized_start=43
+  _globals['_STREAMMESSAGE']._serialized_end=88
+  _globals['_STREAMSUMMARY']._serialized_start=91
+  _globals['_STREAMSUMMARY']._serialized_end=249
+  _globals['_CLIENTSTREAMING']._serialized_start=251
+  _globals['_CLIENTSTREAMING']._serialized_end=357
+# @@protoc_insertion_point(module_scope)
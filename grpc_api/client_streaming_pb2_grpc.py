@@ -0,0 +1,100 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+from . import client_streaming_pb2 as client__streaming__pb2
+
+GRPC_GENERATED_VERSION = '1.75.1'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + f' but the generated code in client_streaming_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class ClientStreamingStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.GetServerResponse = channel.stream_unary(
+                '/clientstreaming.ClientStreaming/GetServerResponse',
+                request_serializer=client__streaming__pb2.StreamMessage.SerializeToString,
+                response_deserializer=client__streaming__pb2.StreamSummary.FromString,
+                _registered_method=True)
+
+
+class ClientStreamingServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def GetServerResponse(self, request_iterator, context):
+        """A client streaming RPC.
+
+        The client streams messages up, like a bulk upload, and the server answers once with what it received.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_ClientStreamingServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'GetServerResponse': grpc.stream_unary_rpc_method_handler(
+                    servicer.GetServerResponse,
+                    request_deserializer=client__streaming__pb2.StreamMessage.FromString,
+                    response_serializer=client__streaming__pb2.StreamSummary.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'clientstreaming.ClientStreaming', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('clientstreaming.ClientStreaming', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class ClientStreaming(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def GetServerResponse(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/clientstreaming.ClientStreaming/GetServerResponse',
+            client__streaming__pb2.StreamMessage.SerializeToString,
+            client__streaming__pb2.StreamSummary.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
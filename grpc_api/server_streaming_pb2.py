@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: server_streaming.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'server_streaming.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x16server_streaming.proto\x12\x0fserverstreaming\"W\n\rStreamRequest\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x0f\n\x07payload\x18\x02 \x01(\x0c\x12\x15\n\rresponse_size\x18\x03 \x01(\r\x12\r\n\x05\x63ount\x18\x04 \x01(\r\"-\n\rStreamMessage\x12\x0b\n\x03seq\x18\x01 \x01(\x04\x12\x0f\n\x07payload\x18\x02 \x01(\x0c\x32j\n\x0fServerStreaming\x12W\n\x11GetServerResponse\x12\x1e.serverstreaming.StreamRequest\x1a\x1e.serverstreaming.StreamMessage\"\x00\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'server_streaming_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_STREAMREQUEST']._serialized_start=43
+  _globals['_STREAMREQUEST']._serialized_end=130
+  _globals['_STREAMMESSAGE']._serialized_start=132
+  _globals['_STREAMMESSAGE']._serialized_end=177
+  _globals['_SERVERSTREAMING']._serialized_start=179
+  _globals['_SERVERSTREAMING']._serialized_end=285
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,100 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+from . import server_streaming_pb2 as server__streaming__pb2
+
+GRPC_GENERATED_VERSION = '1.75.1'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + f' but the generated code in server_streaming_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class ServerStreamingStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.GetServerResponse = channel.unary_stream(
+                '/serverstreaming.ServerStreaming/GetServerResponse',
+                request_serializer=server__streaming__pb2.StreamRequest.SerializeToString,
+                response_deserializer=server__streaming__pb2.StreamMessage.FromString,
+                _registered_method=True)
+
+
+class ServerStreamingServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def GetServerResponse(self, request, context):
+        """A server streaming RPC.
+
+        One request asks for `count` messages of `response_size` bytes each, like a large download.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_ServerStreamingServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'GetServerResponse': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetServerResponse,
+                    request_deserializer=server__streaming__pb2.StreamRequest.FromString,
+                    response_serializer=server__streaming__pb2.StreamMessage.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'serverstreaming.ServerStreaming', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('serverstreaming.ServerStreaming', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class ServerStreaming(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def GetServerResponse(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/serverstreaming.ServerStreaming/GetServerResponse',
+            server__streaming__pb2.StreamRequest.SerializeToString,
+            server__streaming__pb2.StreamMessage.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
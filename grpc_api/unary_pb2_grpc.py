@@ -97,4 +97,4 @@ class Unary(object):
             wait_for_ready,
             timeout,
             metadata,
-            _registered_method=True)
\ No newline at end of file
+            _registered_method=True)
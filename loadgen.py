@@ -0,0 +1,162 @@
+import time
+import threading
+from concurrent import futures
+from colorama import Fore
+from typing import Any, Callable
+
+from logger import ColorLogger
+from stats import RunRecorder
+from results import status_of
+
+
+def record_rpc(recorder:RunRecorder, client:Any, target:str, sent:float, future:Any) -> bool:
+    """
+    Record a finished rpc future sent at perf_counter time `sent`, returns whether it succeeded.
+    A retried rpc is recorded against the target of its last attempt rather than the first.
+    """
+    target = getattr(future, "target", target)
+    done = time.perf_counter()
+    latency = done - sent
+    code, result = status_of(future)
+    backend = client.backend_of(result) if result is not None else None
+    name = backend[0] if backend else None
+
+    if result is not None:
+        recorder.record(target, latency, backend)
+        transfer = client.transfer_of(result)
+        if transfer is not None:
+            recorder.record_transfer(target, *transfer)
+        timing = client.server_time_of(result, future)
+        if timing is not None:
+            recorder.record_server_time(target, latency, *timing)
+    else:
+        recorder.record_error()
+    if recorder.results is not None:
+        recorder.results.write(sent, latency, target, name, code, *client.payload_bytes(result))
+    if recorder.failover is not None:
+        recorder.failover.record(sent, done, result is not None, name, getattr(future, "retries", 0))
+    return result is not None
+
+
+class LoadStats:
+    """
+    Counters shared by every load worker.  Completion callbacks run on gRPC's threads so all updates
+    go through the lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.errors = 0
+        self.start_time = 0.0
+        self.end_time = 0.0
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    def record(self, ok:bool):
+        with self.lock:
+            self.completed += 1
+            if not ok:
+                self.errors += 1
+
+    @property
+    def elapsed(self) -> float:
+        end = self.end_time or time.perf_counter()
+        return max(end - self.start_time, 1e-9)
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.elapsed
+
+
+class LoadWorker(threading.Thread):
+    """
+    Drives one client keeping up to `inflight` rpcs outstanding at all times.
+    """
+    def __init__(self, index:int, client:Any, inflight:int, stats:LoadStats, recorder:RunRecorder,
+                 stop_event:threading.Event, drain_timeout:float = 30.0):
+        super().__init__(name=f"load-{index}", daemon=True)
+        self.client = client
+        self.inflight = inflight
+        self.stats = stats
+        self.recorder = recorder
+        self.stop_event = stop_event
+        self.drain_timeout = drain_timeout
+        self.slots = threading.BoundedSemaphore(inflight)
+
+    def run(self):
+        # Only streaming clients use the executor, threads are created lazily so unary pays nothing for it
+        executor = futures.ThreadPoolExecutor(max_workers=self.inflight, thread_name_prefix=f"{self.name}-stream")
+
+        while not self.stop_event.is_set():
+            if not self.slots.acquire(timeout=0.1):
+                continue
+
+            start = time.perf_counter()
+            try:
+                target, future = self.client.call_future(executor)
+            except Exception:
+                self.slots.release()
+                self.stats.record(False)
+                self.recorder.record_error()
+                continue
+
+            future.add_done_callback(lambda f, target=target, start=start: self._on_done(f, target, start))
+
+        # Wait for every outstanding rpc to hand its slot back before leaving
+        deadline = time.monotonic() + self.drain_timeout
+        for _ in range(self.inflight):
+            if not self.slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                break
+
+        executor.shutdown(wait=False)
+
+    def _on_done(self, future:Any, target:str, start:float):
+        self.stats.record(record_rpc(self.recorder, self.client, target, start, future))
+        self.slots.release()
+
+
+class LoadGenerator:
+    """
+    Concurrent load mode: `workers` threads, each with its own client and each keeping `inflight` rpcs
+    in the air.  Clients built on a channel pool spread their calls over every target.  Runs for
+    `duration` seconds (0 runs until interrupted).
+    """
+    def __init__(self, client_factory:Callable[[], Any], log:ColorLogger, recorder:RunRecorder,
+                 workers:int = 4, inflight:int = 8, duration:float = 10.0):
+        self.log = log
+        self.duration = duration
+        self.stats = LoadStats()
+        self.stop_event = threading.Event()
+        self.workers = [
+            LoadWorker(i, client_factory(), inflight, self.stats, recorder, self.stop_event)
+            for i in range(workers)
+        ]
+
+    def run(self):
+        self.log.info(f"Starting load: {len(self.workers)} workers x {self.workers[0].inflight} in-flight rpcs")
+        self.stats.start()
+        for worker in self.workers:
+            worker.start()
+
+        try:
+            self.stop_event.wait(self.duration if self.duration > 0 else None)
+        except KeyboardInterrupt:
+            self.log.log("Load run interrupted by user. Draining in-flight requests...", color=Fore.MAGENTA)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join()
+        self.stats.stop()
+
+    def report(self):
+        stats = self.stats
+        color = Fore.GREEN if stats.errors == 0 else Fore.YELLOW
+        self.log.log(f"Completed {stats.completed} rpcs ({stats.errors} errors) in {stats.elapsed:.2f}s: "
+                     f"{stats.throughput:.1f} rpc/s", color=color)
@@ -1,19 +1,140 @@
-from datetime import datetime
+import sys
+import time
+import queue
+import atexit
+import itertools
+import threading
 from colorama import Fore, Style, init
 
 init(autoreset=True)
 
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+class _LogWriter(threading.Thread):
+    """
+    Background writer for queued log lines.  Whatever has built up in the queue is written and flushed
+    as one batch, so callers never block on the console.  The queue is bounded: when the console can't
+    keep up, lines are dropped rather than piling up in memory, and the next batch says how many.
+    """
+    MAX_BATCH = 1000
+    MAX_QUEUED = 10000
+
+    def __init__(self):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = queue.Queue(maxsize=self.MAX_QUEUED)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, line:str):
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            # Only the drop path takes the lock
+            with self.lock:
+                self.dropped += 1
+
+    def run(self):
+        while True:
+            line = self.queue.get()
+            if line is None:
+                self._write([])
+                return
+
+            batch = [line]
+            try:
+                while len(batch) < self.MAX_BATCH:
+                    line = self.queue.get_nowait()
+                    if line is None:
+                        self._write(batch)
+                        return
+                    batch.append(line)
+            except queue.Empty:
+                pass
+
+            self._write(batch)
+
+    def _write(self, batch:list[str]):
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            batch.append(f"{Fore.YELLOW}[{ColorLogger._timestamp()}] Logger: {dropped} log lines dropped, "
+                         f"the console could not keep up{Style.RESET_ALL}\n")
+
+        sys.stdout.write("".join(batch))
+        sys.stdout.flush()
+
+    def stop(self):
+        # Flush whatever is queued before the interpreter goes away
+        try:
+            self.queue.put(None, timeout=5)
+        except queue.Full:
+            return
+        self.join(timeout=5)
+
+
 class ColorLogger:
+    # Settings shared by every logger in the process, see configure()
+    level = LEVELS["debug"]
+    request_sample = 1
+    _writer:_LogWriter = None
+    _request_counter = itertools.count()
+    _stamp_second = -1
+    _stamp = ""
+
     def __init__(self, name="Logger"):
         self.name = name
 
+    @classmethod
+    def configure(cls, level:str = "debug", request_sample:int = 1, background:bool = False):
+        """
+        level:          drop lines below this level ('debug', 'info', 'warning' or 'error')
+        request_sample: write 1 in N per-request lines, 0 turns them off
+        background:     queue lines to a writer thread instead of printing on the caller's thread
+        """
+        cls.level = LEVELS[level]
+        cls.request_sample = request_sample
+
+        if background and cls._writer is None:
+            cls._writer = _LogWriter()
+            cls._writer.start()
+            atexit.register(cls._writer.stop)
+
+    @classmethod
+    def _timestamp(cls) -> str:
+        # Formatting the time is a good part of the cost of a line, only do it once a second
+        now = time.time()
+        second = int(now)
+        if second != cls._stamp_second:
+            cls._stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+            cls._stamp_second = second
+        return cls._stamp
+
+    def _emit(self, level:int, message, color):
+        if level < self.level:
+            return
+
+        line = f"{color}[{self._timestamp()}] {self.name}: {message}{Style.RESET_ALL}"
+        if self._writer is not None:
+            self._writer.put(line + "\n")
+        else:
+            print(line)
+
     def log(self, message, color=Fore.WHITE):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"{color}[{timestamp}] {self.name}: {message}{Style.RESET_ALL}")
+        self._emit(LEVELS["info"], message, color)
 
-    def info(self, message): self.log(message, color=Fore.CYAN)
-    def success(self, message): self.log(message, color=Fore.GREEN)
-    def warning(self, message): self.log(message, color=Fore.YELLOW)
-    def error(self, message): self.log(message, color=Fore.RED)
-    def debug(self, message): self.log(message, color=Fore.MAGENTA)
+    def info(self, message): self._emit(LEVELS["info"], message, Fore.CYAN)
+    def success(self, message): self._emit(LEVELS["info"], message, Fore.GREEN)
+    def warning(self, message): self._emit(LEVELS["warning"], message, Fore.YELLOW)
+    def error(self, message): self._emit(LEVELS["error"], message, Fore.RED)
+    def debug(self, message): self._emit(LEVELS["debug"], message, Fore.MAGENTA)
 
+    def should_log_request(self) -> bool:
+        """
+        Sampling decision for a per-request line.  Hot paths check this first so the message isn't even
+        formatted for requests that won't be logged.
+        """
+        sample = self.request_sample
+        if sample <= 0 or self.level > LEVELS["info"]:
+            return False
+        return sample == 1 or next(self._request_counter) % sample == 0
@@ -0,0 +1,273 @@
+import time
+import threading
+import grpc
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+
+from stats import LatencyHistogram
+
+# Handler latency histogram buckets exported to Prometheus, in seconds
+LATENCY_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def peer_ip(peer:str) -> str:
+    # gRPC peer strings look like 'ipv4:10.1.10.5:51234' or 'ipv6:%5B::1%5D:51234'
+    if peer.startswith("ipv4:"):
+        return peer[5:].rsplit(":", 1)[0]
+    if peer.startswith("ipv6:"):
+        return unquote(peer[5:]).rsplit(":", 1)[0].strip("[]")
+    return "unknown"
+
+
+def failed_code(context:Any) -> str:
+    # Status a handler failed with: whatever it aborted with, otherwise an unhandled exception
+    code = context.code()
+    return code.name if isinstance(code, grpc.StatusCode) else "UNKNOWN"
+
+
+class MetricsShard:
+    """
+    One thread's counters.  Only the owning thread writes them, so updates need no lock; a scrape reads
+    every shard and adds them up.
+    """
+    def __init__(self):
+        self.started:dict[str, int] = {}
+        self.handled:dict[tuple[str, str], int] = {}
+        self.streams_started = 0
+        self.streams_finished = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peers:dict[str, int] = {}
+        self.latency:dict[str, LatencyHistogram] = {}
+
+
+class ServerMetrics:
+    """
+    Per-method request counts, in-flight rpcs, active streams, bytes in/out, per-peer counts and handler
+    latency histograms, served as Prometheus text over HTTP.
+
+    Handlers are wrapped at registration.  Each thread updates its own shard, so the hot path is a few
+    dict updates with no lock, and the shards are summed when the endpoint is scraped.  In-flight and
+    active stream gauges are the difference of started and finished totals, so it doesn't matter which
+    thread finishes an rpc.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shards:list[MetricsShard] = []
+        self._local = threading.local()
+        self._http:Optional[ThreadingHTTPServer] = None
+
+    def shard(self) -> MetricsShard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = MetricsShard()
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def _begin(self, method:str, context:Any, stream:bool) -> MetricsShard:
+        shard = self.shard()
+        shard.started[method] = shard.started.get(method, 0) + 1
+        if stream:
+            shard.streams_started += 1
+        ip = peer_ip(context.peer())
+        shard.peers[ip] = shard.peers.get(ip, 0) + 1
+        return shard
+
+    def _end(self, method:str, start:float, code:str, stream:bool):
+        shard = self.shard()
+        key = (method, code)
+        shard.handled[key] = shard.handled.get(key, 0) + 1
+        if stream:
+            shard.streams_finished += 1
+
+        hist = shard.latency.get(method)
+        if hist is None:
+            hist = shard.latency[method] = LatencyHistogram()
+        hist.record(time.perf_counter() - start)
+
+    def count_in(self, deserializer:Callable) -> Callable:
+        # A request deserializer that also counts the bytes in
+        def deserialize(raw:bytes) -> Any:
+            self.shard().bytes_in += len(raw)
+            return deserializer(raw)
+        return deserialize
+
+    def instrument_unary(self, method:str, behavior:Callable, deserializer:Callable, aio:bool = False,
+                         stream:bool = False) -> tuple[Callable, Callable]:
+        """
+        Wrap a handler returning one serialized response, and its request deserializer to count bytes in.
+        Client streaming handlers are wrapped the same way with `stream` set, gRPC deserializes each message.
+        """
+        def unary(request:Any, context:Any) -> bytes:
+            shard = self._begin(method, context, stream)
+            start, code = time.perf_counter(), "UNKNOWN"
+            try:
+                response = behavior(request, context)
+                shard.bytes_out += len(response)
+                code = "OK"
+                return response
+            except Exception:
+                code = failed_code(context)
+                raise
+            finally:
+                self._end(method, start, code, stream)
+
+        async def unary_aio(request:Any, context:Any) -> bytes:
+            shard = self._begin(method, context, stream)
+            start, code = time.perf_counter(), "UNKNOWN"
+            try:
+                response = await behavior(request, context)
+                shard.bytes_out += len(response)
+                code = "OK"
+                return response
+            except Exception:
+                code = failed_code(context)
+                raise
+            finally:
+                self._end(method, start, code, stream)
+
+        return (unary_aio if aio else unary), self.count_in(deserializer)
+
+    def instrument_stream(self, method:str, behavior:Callable, aio:bool = False, request_stream:bool = True) -> Callable:
+        """
+        Wrap a stream-stream handler whose requests and replies are raw bytes.  A stream that ends without
+        finishing or failing was cancelled by the client.  The threaded engine just sees the request
+        iterator end when a client goes away, so those streams count as OK there.
+
+        Server streaming handlers get one request rather than an iterator, pass request_stream=False and
+        count its bytes with count_in() on the deserializer.
+        """
+        def count_in(request_iterator:Any):
+            shard = self.shard()
+            for raw in request_iterator:
+                shard.bytes_in += len(raw)
+                yield raw
+
+        def stream(request_iterator:Any, context:Any):
+            shard = self._begin(method, context, True)
+            start, code = time.perf_counter(), "CANCELLED"
+            try:
+                requests = count_in(request_iterator) if request_stream else request_iterator
+                for reply in behavior(requests, context):
+                    shard.bytes_out += len(reply)
+                    yield reply
+                code = "OK"
+            except Exception:
+                code = failed_code(context)
+                raise
+            finally:
+                self._end(method, start, code, True)
+
+        async def count_in_aio(request_iterator:Any):
+            shard = self.shard()
+            async for raw in request_iterator:
+                shard.bytes_in += len(raw)
+                yield raw
+
+        async def stream_aio(request_iterator:Any, context:Any):
+            shard = self._begin(method, context, True)
+            start, code = time.perf_counter(), "CANCELLED"
+            try:
+                requests = count_in_aio(request_iterator) if request_stream else request_iterator
+                async for reply in behavior(requests, context):
+                    shard.bytes_out += len(reply)
+                    yield reply
+                code = "OK"
+            except Exception:
+                code = failed_code(context)
+                raise
+            finally:
+                self._end(method, start, code, True)
+
+        return stream_aio if aio else stream
+
+    def render(self) -> str:
+        # Sum the shards.  Dicts are copied first as their threads may be adding keys mid-scrape.
+        with self.lock:
+            shards = list(self.shards)
+
+        started:dict[str, int] = {}
+        handled:dict[tuple[str, str], int] = {}
+        peers:dict[str, int] = {}
+        latency:dict[str, LatencyHistogram] = {}
+        streams, bytes_in, bytes_out = 0, 0, 0
+
+        for shard in shards:
+            for method, n in shard.started.copy().items():
+                started[method] = started.get(method, 0) + n
+            for key, n in shard.handled.copy().items():
+                handled[key] = handled.get(key, 0) + n
+            for ip, n in shard.peers.copy().items():
+                peers[ip] = peers.get(ip, 0) + n
+            for method, hist in shard.latency.copy().items():
+                latency.setdefault(method, LatencyHistogram()).merge(hist)
+            streams += shard.streams_started - shard.streams_finished
+            bytes_in += shard.bytes_in
+            bytes_out += shard.bytes_out
+
+        lines = []
+        def metric(name:str, kind:str, help:str, samples:list[tuple[str, Any]]):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        metric("grpc_server_started_total", "counter", "RPCs started on the server.",
+               [(f'{{grpc_method="{m}"}}', n) for m, n in sorted(started.items())])
+        metric("grpc_server_handled_total", "counter", "RPCs completed on the server, by status code.",
+               [(f'{{grpc_method="{m}",grpc_code="{c}"}}', n) for (m, c), n in sorted(handled.items())])
+        metric("grpc_server_in_flight", "gauge", "RPCs currently being handled.",
+               [("", sum(started.values()) - sum(handled.values()))])
+        metric("grpc_server_active_streams", "gauge", "Streaming RPCs currently open.", [("", streams)])
+        metric("grpc_server_received_bytes_total", "counter", "Serialized request message bytes received.", [("", bytes_in)])
+        metric("grpc_server_sent_bytes_total", "counter", "Serialized response message bytes sent.", [("", bytes_out)])
+        metric("grpc_server_peer_requests_total", "counter", "RPCs started, by client (or proxy) IP.",
+               [(f'{{peer="{ip}"}}', n) for ip, n in sorted(peers.items())])
+
+        lines.append("# HELP grpc_server_handling_seconds Handler latency of completed RPCs.")
+        lines.append("# TYPE grpc_server_handling_seconds histogram")
+        bounds_us = [int(b * 1_000_000) for b in LATENCY_BOUNDS]
+        for method, hist in sorted(latency.items()):
+            # Shards are merged while their threads record, so the count can be out of step with the
+            # buckets.  Take +Inf and _count from the buckets themselves to keep the series monotonic.
+            total = sum(hist.counts)
+            for bound, n in zip(LATENCY_BOUNDS, hist.cumulative_counts(bounds_us)):
+                lines.append(f'grpc_server_handling_seconds_bucket{{grpc_method="{method}",le="{bound}"}} {n}')
+            lines.append(f'grpc_server_handling_seconds_bucket{{grpc_method="{method}",le="+Inf"}} {total}')
+            lines.append(f'grpc_server_handling_seconds_sum{{grpc_method="{method}"}} {hist.total_us / 1e6}')
+            lines.append(f'grpc_server_handling_seconds_count{{grpc_method="{method}"}} {total}')
+
+        return "\n".join(lines) + "\n"
+
+    def serve_http(self, ip:str, port:int):
+        # Scrapes are handled on their own threads, away from the gRPC server's
+        self._http = ThreadingHTTPServer((ip, port), _MetricsHandler)
+        self._http.daemon_threads = True
+        self._http.metrics = self
+        threading.Thread(target=self._http.serve_forever, name="metrics-http", daemon=True).start()
+
+    def close(self):
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format:str, *args:Any):
+        # A line per scrape isn't worth the console
+        pass
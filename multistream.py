@@ -0,0 +1,211 @@
+import time
+import random
+import signal
+import asyncio
+import grpc
+from colorama import Fore
+from typing import Callable
+
+from logger import ColorLogger
+from stats import LatencyHistogram, BackendDistribution, RunRecorder
+from grpc_api import bidir, pb2_grpc_bidir, BACKEND_METADATA_KEY
+
+
+class MultiStreamCounters:
+    """
+    Running totals across every stream.  Only the event loop writes them, the reporter just reads.
+    """
+    def __init__(self):
+        self.opened = 0
+        self.failed = 0
+        self.active = 0
+        self.messages = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors:dict[str, int] = {}
+
+
+class MultiStreamBenchmark:
+    """
+    Many concurrent bidirectional streams multiplexed over a few shared channels, held open for `duration`
+    seconds (0 holds them until interrupted).
+
+    Every stream is an asyncio task on one event loop rather than a thread, so thousands of streams cost
+    little more than their HTTP/2 state.  Stream i rides channel i % channels and the channels alternate
+    over the targets.  Setup latency runs from opening the stream to the server's initial metadata, which
+    names the backend holding it.  Each stream then ping-pongs messages, at `rate` per second per stream or
+    back to back if 0, and every round trip goes into the recorder.
+    """
+    def __init__(self, targets:list[str], channel_factory:Callable[[str], grpc.aio.Channel], log:ColorLogger,
+                 recorder:RunRecorder, streams:int = 100, per_target:int = 1, rate:float = 0.0,
+                 duration:float = 10.0, payload:bytes = b"", response_size:int = 0, connect_timeout:float = 10.0):
+        self.targets = targets
+        self.channel_factory = channel_factory
+        self.log = log
+        self.recorder = recorder
+        self.streams = streams
+        self.per_target = per_target
+        self.rate = rate
+        self.duration = duration
+        self.payload = payload
+        self.response_size = response_size
+        self.connect_timeout = connect_timeout
+        self.setup = LatencyHistogram()
+        self.backends = BackendDistribution(unit="streams")
+        self.counters = MultiStreamCounters()
+        self.stop_event:asyncio.Event = None
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self._last = (0.0, 0)
+
+    async def _connect(self) -> list[tuple[str, grpc.aio.Channel]]:
+        # Interleave targets so consecutive streams land on different targets
+        channels = []
+        for _ in range(self.per_target):
+            for target in self.targets:
+                channel = self.channel_factory(target)
+                if channel is not None:
+                    channels.append((target, channel))
+
+        async def ready(target:str, channel:grpc.aio.Channel) -> bool:
+            try:
+                await asyncio.wait_for(channel.channel_ready(), self.connect_timeout)
+                return True
+            except asyncio.TimeoutError:
+                self.log.warning(f"Channel to {target} not ready after {self.connect_timeout:.0f}s")
+                return False
+
+        results = await asyncio.gather(*(ready(target, channel) for target, channel in channels))
+        self.log.info(f"Stream channels ready: {sum(results)}/{len(channels)} connected")
+        return channels
+
+    async def _stream(self, target:str, channel:grpc.aio.Channel):
+        counters = self.counters
+        stub = pb2_grpc_bidir.BidirectionalStub(channel)
+        opened = False
+
+        start = time.perf_counter()
+        call = stub.GetServerResponse()
+        try:
+            metadata = await call.initial_metadata()
+            if call.done():
+                # Ended before the server answered
+                self._failed(target, await call.code(), await call.details())
+                return
+            self.setup.record(time.perf_counter() - start)
+            self.backends.record(metadata.get(BACKEND_METADATA_KEY) or target)
+            opened = True
+            counters.opened += 1
+            counters.active += 1
+
+            # Each stream gets a random phase so paced streams don't all send in the same instant
+            interval = 1.0 / self.rate if self.rate > 0 else 0.0
+            next_send = time.perf_counter() + random.random() * interval
+            seq = 0
+
+            while not self.stop_event.is_set():
+                if interval:
+                    delay = next_send - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_send += interval
+
+                await call.write(bidir.Message(seq=seq, sent_ns=time.perf_counter_ns(), payload=self.payload,
+                                               response_size=self.response_size))
+                echo = await call.read()
+                if echo is grpc.aio.EOF:
+                    break
+
+                self.recorder.latency.record(target, (time.perf_counter_ns() - echo.sent_ns) / 1e9)
+                counters.messages += 1
+                counters.bytes_sent += len(self.payload)
+                counters.bytes_received += len(echo.payload)
+                seq += 1
+
+            await call.done_writing()
+            code = await call.code()
+            if code != grpc.StatusCode.OK:
+                self._failed(target, code, await call.details())
+
+        except grpc.aio.AioRpcError as e:
+            self._failed(target, e.code(), e.details())
+
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+
+        finally:
+            if opened:
+                counters.active -= 1
+
+    def _failed(self, target:str, code:grpc.StatusCode, details:str):
+        # Only the first failure of each kind is logged, thousands of streams can fail together
+        counters = self.counters
+        counters.failed += 1
+        self.recorder.record_error()
+        if code.name not in counters.errors:
+            self.log.error(f"Stream to {target} failed: {code.name} {details}")
+        counters.errors[code.name] = counters.errors.get(code.name, 0) + 1
+
+    async def _run(self, drain_timeout:float = 10.0):
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop_event.set)
+
+        channels = await self._connect()
+        if not channels:
+            self.log.error("No channels could be created for the streams")
+            self.start_time = self.end_time = time.perf_counter()
+            return
+        self.log.info(f"Opening {self.streams} streams over {len(channels)} channels")
+        self.start_time = time.perf_counter()
+        self._last = (self.start_time, 0)
+
+        tasks = [asyncio.create_task(self._stream(*channels[i % len(channels)])) for i in range(self.streams)]
+
+        # Hold the streams for the duration, unless interrupted or every stream has already ended
+        stopped = asyncio.create_task(self.stop_event.wait())
+        ended = asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.wait([stopped, ended], timeout=self.duration or None, return_when=asyncio.FIRST_COMPLETED)
+        if stopped.done():
+            self.log.log("Streams interrupted by user. Closing the streams...", color=Fore.MAGENTA)
+
+        # Let every stream finish its current round trip and close cleanly, then give up on stragglers
+        self.stop_event.set()
+        _, pending = await asyncio.wait(tasks, timeout=drain_timeout)
+        if pending:
+            self.log.warning(f"{len(pending)} streams did not close within {drain_timeout:.0f}s, cancelling them")
+            for task in pending:
+                task.cancel()
+        await ended
+
+        self.end_time = time.perf_counter()
+        for _, channel in channels:
+            await channel.close()
+
+    def run(self):
+        asyncio.run(self._run())
+
+    def report_interval(self, log:ColorLogger, seconds:float):
+        now, counters = time.perf_counter(), self.counters
+        last_time, last_messages = self._last
+        self._last = (now, counters.messages)
+
+        elapsed = max(now - last_time, 1e-9)
+        log.log(f"Streams: {counters.active} active, {counters.failed} failed, "
+                f"{(counters.messages - last_messages) / elapsed:.0f} msg/s", color=Fore.CYAN)
+
+    def report(self):
+        counters = self.counters
+        elapsed = max((self.end_time or time.perf_counter()) - self.start_time, 1e-9)
+        color = Fore.GREEN if counters.failed == 0 and counters.opened == self.streams else Fore.YELLOW
+
+        self.log.log(f"Opened {counters.opened} of {self.streams} streams ({counters.failed} failed)", color=color)
+        self.log.log(f"Stream setup: {self.setup.summary()}", color=Fore.CYAN)
+        self.log.log(f"Exchanged {counters.messages} messages in {elapsed:.2f}s: {counters.messages / elapsed:.0f} msg/s, "
+                     f"{counters.bytes_sent / elapsed / 1e6:.2f} MB/s out, {counters.bytes_received / elapsed / 1e6:.2f} MB/s in",
+                     color=color)
+        for name in sorted(counters.errors):
+            self.log.warning(f"  {name}: {counters.errors[name]} streams")
+        self.backends.report(self.log)
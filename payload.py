@@ -0,0 +1,76 @@
+import os
+import threading
+import grpc
+from typing import Callable
+
+# Headroom on top of the payload for the rest of the message and protobuf framing
+MESSAGE_OVERHEAD = 64 * 1024
+
+# gRPC's own default receive limit, never go below it
+DEFAULT_MESSAGE_LIMIT = 4 * 1024 * 1024
+
+
+# Compression algorithms by the name used on the command line
+COMPRESSION = {"none": grpc.Compression.NoCompression, "deflate": grpc.Compression.Deflate, "gzip": grpc.Compression.Gzip}
+
+# Filler for the compressible part of payloads
+REPEATED_TEXT = b"gRPC load balancer test payload. "
+
+
+def make_payload(size:int, compressibility:float = 0.0) -> bytes:
+    """
+    Random bytes apart from a `compressibility` fraction of repeated text at the end, which gzip and
+    deflate squeeze to almost nothing.  0 doesn't compress at all, 1 compresses as far as it can.
+    """
+    repeated = int(size * compressibility)
+    return os.urandom(size - repeated) + (REPEATED_TEXT * (repeated // len(REPEATED_TEXT) + 1))[:repeated]
+
+
+def message_limit(*sizes:int) -> int:
+    """
+    Channel / server message size limit that fits the largest of the given payload sizes.
+    """
+    return max(DEFAULT_MESSAGE_LIMIT, max(sizes, default=0) + MESSAGE_OVERHEAD)
+
+
+def message_size_options(limit:int) -> list[tuple[str, int]]:
+    return [("grpc.max_send_message_length", limit), ("grpc.max_receive_message_length", limit)]
+
+
+class PayloadCache:
+    """
+    Payloads built once per size along with their serialized protobuf field.
+
+    `encode` serializes a message holding nothing but the payload, which is exactly the tag, length and
+    bytes of the payload field.  Protobuf allows fields in any order, so appending that to the serialized
+    remainder of a message yields the full message without copying the payload through protobuf on
+    every request.
+
+    Clients choose the sizes, so the cache holds at most `max_bytes` of fields and evicts the oldest sizes
+    to make room.  Hits never take the lock.
+    """
+    def __init__(self, encode:Callable[[bytes], bytes], max_size:int = DEFAULT_MESSAGE_LIMIT, max_bytes:int = 64 * 1024 * 1024,
+                 compressibility:float = 0.0):
+        self.encode = encode
+        self.compressibility = compressibility
+        self.max_size = max_size
+        self.max_bytes = max(max_bytes, max_size + MESSAGE_OVERHEAD)
+        self.lock = threading.Lock()
+        self.fields:dict[int, bytes] = {}
+        self.cached_bytes = 0
+
+    def field(self, size:int) -> bytes:
+        field = self.fields.get(size)
+        if field is None:
+            if size > self.max_size:
+                raise ValueError(f"Requested payload of {size} bytes is over the {self.max_size} byte limit")
+            field = self.encode(make_payload(size, self.compressibility))
+            with self.lock:
+                if size in self.fields:
+                    return self.fields[size]
+                # Dicts keep insertion order, so the first keys are the oldest sizes
+                while self.fields and self.cached_bytes + len(field) > self.max_bytes:
+                    self.cached_bytes -= len(self.fields.pop(next(iter(self.fields))))
+                self.fields[size] = field
+                self.cached_bytes += len(field)
+        return field
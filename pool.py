@@ -0,0 +1,93 @@
+import grpc
+import time
+import threading
+from typing import Any, Callable
+
+from logger import ColorLogger
+
+
+class PooledChannel:
+    """
+    One warm channel in the pool, with the stubs built on it and the number of rpcs it has outstanding.
+    """
+    def __init__(self, target:str, channel:grpc.Channel):
+        self.target = target
+        self.channel = channel
+        self.outstanding = 0
+        self.stubs:dict[type, Any] = {}
+
+    def stub(self, stub_class:type) -> Any:
+        stub = self.stubs.get(stub_class)
+        if stub is None:
+            stub = self.stubs[stub_class] = stub_class(self.channel)
+        return stub
+
+
+class ChannelPool:
+    """
+    Keeps `per_target` channels open to every target and hands them out per call, either round-robin
+    or to the channel with the fewest rpcs outstanding.  Channels are created once and pre-connected, so
+    calls never pay for connection setup or the TLS handshake.
+    """
+    POLICIES = ("round-robin", "least-outstanding")
+
+    def __init__(self, targets:list[str], channel_factory:Callable[[str], grpc.Channel], log:ColorLogger,
+                 per_target:int = 1, policy:str = "round-robin"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown channel pool policy: {policy}")
+
+        self.log = log
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.next_index = 0
+
+        # Interleave targets so round-robin alternates targets rather than draining one at a time
+        self.channels:list[PooledChannel] = []
+        for _ in range(per_target):
+            for target in targets:
+                channel = channel_factory(target)
+                if channel is not None:
+                    self.channels.append(PooledChannel(target, channel))
+
+        if not self.channels:
+            raise ValueError("No channels could be created for the pool")
+
+    def connect(self, timeout:float = 10.0) -> int:
+        """
+        Wait for every channel to connect.  Unreachable targets are logged and left in the pool; gRPC keeps
+        reconnecting them in the background.  Returns how many channels are ready.
+        """
+        # One deadline for the whole pool, not `timeout` per channel
+        pending = [(pc, grpc.channel_ready_future(pc.channel)) for pc in self.channels]
+        deadline = time.monotonic() + timeout
+        ready = 0
+        for pc, future in pending:
+            try:
+                future.result(timeout=max(deadline - time.monotonic(), 0))
+                ready += 1
+            except grpc.FutureTimeoutError:
+                self.log.warning(f"Channel to {pc.target} not ready after {timeout:.0f}s")
+
+        self.log.info(f"Channel pool ready: {ready}/{len(self.channels)} channels connected ({self.policy})")
+        return ready
+
+    def acquire(self) -> PooledChannel:
+        with self.lock:
+            if self.policy == "least-outstanding":
+                # Scan from the rotation point so ties, the usual case at low concurrency, still rotate
+                count = len(self.channels)
+                index = min(((self.next_index + i) % count for i in range(count)), key=lambda i: self.channels[i].outstanding)
+            else:
+                index = self.next_index
+            pc = self.channels[index]
+            self.next_index = (index + 1) % len(self.channels)
+            pc.outstanding += 1
+            return pc
+
+    def release(self, pc:PooledChannel):
+        with self.lock:
+            pc.outstanding -= 1
+
+    def close(self):
+        for pc in self.channels:
+            pc.channel.close()
@@ -0,0 +1,92 @@
+import json
+import heapq
+from concurrent import futures
+from colorama import Fore
+from typing import Any, Callable, Iterator
+
+from logger import ColorLogger
+from results import TraceLog
+from scheduler import OpenLoopRunner, wait_until
+from stats import RunRecorder
+
+
+def read_header(path:str) -> dict[str, Any]:
+    with open(path + ".json") as f:
+        header = json.load(f)
+    if header.get("format") != TraceLog.RECORD_FORMAT:
+        raise ValueError(f"{path} was written with trace format {header.get('format')}, expected {TraceLog.RECORD_FORMAT}")
+    return header
+
+
+def read_trace(path:str, offset:float = 0.0, chunk:int = 1 << 20) -> Iterator[tuple[float, str, int, int, int]]:
+    """
+    Records of one trace as (send time in seconds plus offset, type, request size, response size, messages).
+    The file is read a chunk at a time, so traces of any size replay in constant memory.  A partial record
+    at the end, from a run that was killed, is ignored.
+    """
+    types = read_header(path)["types"]
+    size = TraceLog.RECORD.size
+    step = max(chunk // size, 1) * size
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(step)
+            for sent_ns, request_size, response_size, messages, type_id in TraceLog.RECORD.iter_unpack(data[:len(data) - len(data) % size]):
+                yield sent_ns / 1e9 + offset, types[type_id], request_size, response_size, messages
+            if len(data) < step:
+                return
+
+
+def merge_traces(paths:list[str]) -> Iterator[tuple[float, str, int, int, int]]:
+    # Several traces, e.g. every FILE.N of a --processes run, on one timeline starting at the earliest
+    starts = [read_header(path)["start_epoch"] for path in paths]
+    first = min(starts)
+    return heapq.merge(*(read_trace(path, start - first) for path, start in zip(paths, starts)), key=lambda r: r[0])
+
+
+class ReplayRunner(OpenLoopRunner):
+    """
+    Re-issues a trace with the same gaps between sends, divided by `speed`.  Send times are computed from
+    the start of the replay like the open-loop schedule, so timing never drifts however long the trace,
+    and latency is measured from the intended send time.
+
+    client_for(type, request_size, response_size, messages) returns the client that sends one traced
+    rpc, callers cache them so a size mix doesn't build a client per rpc.
+    """
+    def __init__(self, client_for:Callable[[str, int, int, int], Any], log:ColorLogger, recorder:RunRecorder,
+                 records:Iterator[tuple[float, str, int, int, int]], speed:float = 1.0, max_inflight:int = 1000):
+        super().__init__(None, log, recorder, rate=0.0, duration=0.0, max_inflight=max_inflight)
+        self.client_for = client_for
+        self.records = records
+        self.speed = speed
+        self.traced_seconds = 0.0
+
+    def run(self):
+        self.log.info(f"Starting replay at {self.speed:g}x")
+
+        executor = futures.ThreadPoolExecutor(max_workers=min(self.max_inflight, 256), thread_name_prefix="replay")
+        self.stats.start()
+        start = self.stats.start_time
+
+        try:
+            for sent, type, request_size, response_size, messages in self.records:
+                self.traced_seconds = sent
+                intended = start + sent / self.speed
+                wait_until(intended)
+                self._send(self.client_for(type, request_size, response_size, messages), intended, executor)
+
+        except KeyboardInterrupt:
+            self.log.log("Replay interrupted by user. Draining in-flight requests...", color=Fore.MAGENTA)
+
+        finally:
+            self._drain()
+            executor.shutdown(wait=False)
+            self.stats.stop()
+
+    def report(self):
+        stats = self.stats
+        color = Fore.GREEN if stats.errors == 0 else Fore.YELLOW
+        self.log.log(f"Replayed {stats.completed} rpcs ({stats.errors} errors), {self.traced_seconds:.2f}s of trace "
+                     f"in {stats.elapsed:.2f}s at {self.speed:g}x: {stats.throughput:.1f} rpc/s", color=color)
+        if self.max_lag > 0.01:
+            self.log.warning(f"Sends fell up to {self.max_lag * 1000:.1f}ms behind the trace (in-flight cap or client CPU), "
+                             f"latencies include that wait")
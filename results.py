@@ -0,0 +1,118 @@
+import json
+import time
+import struct
+import threading
+import grpc
+from typing import Any, Optional
+
+# Status codes by number, as stored in the records
+STATUS_NAMES = {code.value[0]: code.name for code in grpc.StatusCode}
+
+
+def status_of(future:Any) -> tuple[int, Any]:
+    """
+    Status code number of a finished rpc future, and its result if it succeeded.
+    """
+    try:
+        error = future.exception()
+    except Exception:
+        # Cancelled futures raise rather than return their exception
+        return grpc.StatusCode.CANCELLED.value[0], None
+
+    if error is None:
+        return grpc.StatusCode.OK.value[0], future.result()
+    if isinstance(error, grpc.RpcError):
+        return error.code().value[0], None
+    return grpc.StatusCode.UNKNOWN.value[0], None
+
+
+class ResultLog:
+    """
+    Fixed-width binary record of every rpc in a run, for post-mortems with analyze.py.
+
+    Each record is RECORD_FORMAT: the send time in ns from the start of the log, latency in us, payload bytes
+    sent and received, target and backend ids and the status code.  Records go through a large buffered
+    writer, so the hot path is one struct pack and a memory copy.  Target and backend names are kept in
+    tables and written with the run's start time to a JSON sidecar, `<path>.json`, when the log is closed.
+    """
+    RECORD_FORMAT = "<qIIIHHB3x"
+    RECORD = struct.Struct(RECORD_FORMAT)
+    MAX_ID = 0xFFFF
+
+    def __init__(self, path:str, buffer_size:int = 1 << 20):
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.targets:dict[str, int] = {}
+        self.backends:dict[str, int] = {"": 0}     # id 0 is an unknown backend
+        self.start = time.perf_counter()
+        self.start_epoch = time.time()
+
+    def _id(self, table:dict[str, int], name:str) -> int:
+        index = table.get(name)
+        if index is None:
+            with self.lock:
+                index = table.setdefault(name, min(len(table), self.MAX_ID))
+        return index
+
+    def write(self, sent:float, latency:float, target:str, backend:Optional[str], code:int,
+              bytes_sent:int = 0, bytes_received:int = 0):
+        """
+        sent is the rpc's perf_counter send time and latency is in seconds.
+        """
+        self.file.write(self.RECORD.pack(int((sent - self.start) * 1e9), min(int(latency * 1e6), 0xFFFFFFFF),
+                                         bytes_sent, bytes_received, self._id(self.targets, str(target)),
+                                         self._id(self.backends, backend or ""), code))
+
+    def close(self):
+        self.file.close()
+        header = {"format": self.RECORD_FORMAT, "start_epoch": self.start_epoch,
+                  "targets": sorted(self.targets, key=self.targets.get),
+                  "backends": sorted(self.backends, key=self.backends.get)}
+        with open(self.path + ".json", "w") as f:
+            json.dump(header, f, indent=2)
+            f.write("\n")
+
+
+class TraceLog:
+    """
+    Compact trace of the rpcs a run sent, in the order it sent them, for replay with --mode replay.
+
+    Each record is RECORD_FORMAT: the send time in ns from the start of the trace, the rpc type id,
+    request and response payload bytes and the number of messages the rpc sends (1 for unary).  Type
+    names and the largest payloads are written with the start time to a JSON sidecar, `<path>.json`,
+    when the trace is closed.
+    """
+    RECORD_FORMAT = "<qIIIB3x"
+    RECORD = struct.Struct(RECORD_FORMAT)
+
+    def __init__(self, path:str, buffer_size:int = 1 << 20):
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.lock = threading.Lock()
+        self.types:dict[str, int] = {}
+        self.max_request = 0
+        self.max_response = 0
+        self.start = time.perf_counter()
+        self.start_epoch = time.time()
+
+    def write(self, sent:float, type:str, request_size:int, response_size:int, messages:int = 1):
+        """
+        sent is the rpc's perf_counter send time.
+        """
+        type_id = self.types.get(type)
+        if type_id is None:
+            with self.lock:
+                type_id = self.types.setdefault(type, len(self.types))
+        self.max_request = max(self.max_request, request_size)
+        self.max_response = max(self.max_response, response_size)
+        self.file.write(self.RECORD.pack(int((sent - self.start) * 1e9), request_size, response_size, messages, type_id))
+
+    def close(self):
+        self.file.close()
+        header = {"format": self.RECORD_FORMAT, "start_epoch": self.start_epoch,
+                  "types": sorted(self.types, key=self.types.get),
+                  "max_request_size": self.max_request, "max_response_size": self.max_response}
+        with open(self.path + ".json", "w") as f:
+            json.dump(header, f, indent=2)
+            f.write("\n")
@@ -0,0 +1,129 @@
+import time
+import random
+import threading
+from concurrent import futures
+from colorama import Fore
+from typing import Any
+
+from logger import ColorLogger
+from loadgen import LoadStats, record_rpc
+from stats import RunRecorder
+
+
+def wait_until(when:float):
+    """
+    Sleep until the perf_counter time `when`.  Callers always compute `when` from the start of the run
+    rather than from the previous wakeup, so oversleeping never accumulates into drift.
+    """
+    delay = when - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+class ArrivalSchedule:
+    """
+    Intended send times on an absolute timeline, at `rate` per second.  'constant' spaces sends evenly,
+    'poisson' draws exponential gaps so arrivals look like independent users.
+    """
+    def __init__(self, rate:float, arrival:str = "constant", start:float = None):
+        self.rate = rate
+        self.arrival = arrival
+        self.start = time.perf_counter() if start is None else start
+        self.sent = 0
+        self._offset = 0.0
+
+    def next(self) -> float:
+        self.sent += 1
+        if self.arrival == "poisson":
+            self._offset += random.expovariate(self.rate)
+            return self.start + self._offset
+
+        # Multiply rather than accumulate so float error can't build up over long runs
+        return self.start + (self.sent - 1) / self.rate
+
+
+class OpenLoopRunner:
+    """
+    Open-loop load: rpcs are issued on the arrival schedule whatever the responses are doing.  The
+    client's channel pool spreads them over the targets.
+
+    Latency is measured from the intended send time rather than the actual one.  If the targets stall
+    and the in-flight cap holds the schedule back, the time spent waiting to send is charged to the
+    requests that were delayed, which corrects for coordinated omission.
+    """
+    def __init__(self, client:Any, log:ColorLogger, recorder:RunRecorder,
+                 rate:float, arrival:str = "constant", duration:float = 10.0, max_inflight:int = 1000):
+        self.log = log
+        self.recorder = recorder
+        self.rate = rate
+        self.arrival = arrival
+        self.duration = duration
+        self.max_inflight = max_inflight
+        self.stats = LoadStats()
+        self.client = client
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.max_lag = 0.0
+        self.interrupted = False
+
+    def run(self):
+        self.log.info(f"Starting open-loop load: {self.rate:.1f} rpc/s ({self.arrival})")
+
+        # Streaming rpcs have no native future so they need a thread each while in flight
+        executor = futures.ThreadPoolExecutor(max_workers=min(self.max_inflight, 256), thread_name_prefix="open-loop")
+        schedule = ArrivalSchedule(self.rate, self.arrival)
+        end = schedule.start + self.duration if self.duration > 0 else float("inf")
+        self.stats.start()
+
+        try:
+            while True:
+                intended = schedule.next()
+                if intended >= end:
+                    break
+
+                wait_until(intended)
+                self._send(self.client, intended, executor)
+
+        except KeyboardInterrupt:
+            self.interrupted = True
+            self.log.log("Open-loop run interrupted by user. Draining in-flight requests...", color=Fore.MAGENTA)
+
+        finally:
+            self._drain()
+            executor.shutdown(wait=False)
+            self.stats.stop()
+
+    def _drain(self, timeout:float = 30.0):
+        deadline = time.monotonic() + timeout
+        for _ in range(self.max_inflight):
+            if not self.slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                self.log.warning("Timed out waiting for in-flight rpcs to finish")
+                break
+
+    def _send(self, client:Any, intended:float, executor:futures.Executor):
+        # Issue one rpc once an in-flight slot is free
+        self.slots.acquire()
+        self.max_lag = max(self.max_lag, time.perf_counter() - intended)
+
+        try:
+            target, future = client.call_future(executor)
+        except Exception:
+            self.slots.release()
+            self.stats.record(False)
+            self.recorder.record_error()
+            return
+
+        future.add_done_callback(lambda f: self._on_done(f, client, target, intended))
+
+    def _on_done(self, future:Any, client:Any, target:str, intended:float):
+        # Latency runs from the intended send time
+        self.stats.record(record_rpc(self.recorder, client, target, intended, future))
+        self.slots.release()
+
+    def report(self):
+        stats = self.stats
+        color = Fore.GREEN if stats.errors == 0 else Fore.YELLOW
+        self.log.log(f"Completed {stats.completed} rpcs ({stats.errors} errors) in {stats.elapsed:.2f}s: "
+                     f"{stats.throughput:.1f} rpc/s achieved of {self.rate:.1f} rpc/s offered", color=color)
+        if self.max_lag > 0.01:
+            self.log.warning(f"Sends fell up to {self.max_lag * 1000:.1f}ms behind schedule (in-flight cap or client CPU), "
+                             f"latencies include that wait")
@@ -1,49 +1,192 @@
 import os
 import grpc
+import time
 import socket
+import itertools
+import signal
+import asyncio
 import argparse
-from concurrent import futures
+import threading
+import multiprocessing
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 from colorama import Fore
 from typing import Any
 
 from logger import ColorLogger
 from config import ServerConfig
-from grpc_api import pb2, pb2_grpc, pb2_grpc_bidir
+from metrics import ServerMetrics, peer_ip
+from faults import FaultInjector
+from servertime import QueueTimingExecutor, time_unary, time_stream
+from payload import PayloadCache, COMPRESSION, DEFAULT_MESSAGE_LIMIT, MESSAGE_OVERHEAD, message_size_options
+from grpc_api import pb2, pb2_grpc, bidir, pb2_grpc_bidir, sstream, pb2_grpc_sstream, cstream, pb2_grpc_cstream, BACKEND_METADATA_KEY
 
 # Get Logging
 logger = ColorLogger("gRPC Server")
 
+# Signal that drains the server: health goes NOT_SERVING, then in-flight rpcs finish and it exits
+DRAIN_SIGNAL = signal.SIGUSR1
+
 
 class BidirectionalService(pb2_grpc_bidir.BidirectionalServicer):
+    # Messages arrive and leave as raw bytes (see add_service), so plain echoes are never re-serialized
+
+    def __init__(self, max_payload:int = DEFAULT_MESSAGE_LIMIT, compressibility:float = 0.0):
+        self.payloads = PayloadCache(lambda data: bidir.Message(payload=data).SerializeToString(), max_payload,
+                                     compressibility=compressibility)
+
+        # Sent as initial metadata so clients know which backend holds each stream before any message
+        self.identity = ((BACKEND_METADATA_KEY, f"{socket.gethostname()}:{os.getpid()}"),)
 
     def GetServerResponse(self, request_iterator:Any, context):
+        context.send_initial_metadata(self.identity)
         for message in request_iterator:
-            yield message
+            try:
+                reply = self._build_reply(message)
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            yield reply
+
+    def _build_reply(self, raw:bytes) -> bytes:
+        message = bidir.Message.FromString(raw)
+        if not message.response_size:
+            return raw
+
+        # Reply with a cached payload of the requested size in place of the one that was sent
+        message.ClearField("payload")
+        return message.SerializeToString() + self.payloads.field(message.response_size)
+
+
+class AsyncBidirectionalService(BidirectionalService):
+
+    async def GetServerResponse(self, request_iterator:Any, context):
+        await context.send_initial_metadata(self.identity)
+        async for message in request_iterator:
+            try:
+                reply = self._build_reply(message)
+            except ValueError as e:
+                await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            yield reply
 
 
 class UnaryService(pb2_grpc.UnaryServicer):
 
+    def __init__(self, max_payload:int = DEFAULT_MESSAGE_LIMIT, compressibility:float = 0.0):
+        # Services are created inside each worker process, so this is the pid actually serving
+        self.pid = os.getpid()
+        self.request_counter = itertools.count(1)
+        self.payloads = PayloadCache(lambda data: pb2.MessageResponse(payload=data).SerializeToString(), max_payload,
+                                     compressibility=compressibility)
+
     def GetServerResponse(self, request:Any, context:Any):
+        try:
+            return self._build_response(request, context)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+    def _build_response(self, request:Any, context:Any) -> bytes:
         # get the string from the incoming request, and svr identity
         message = request.message
         hostname, peer_ip = self._get_server_identity(context)
+        payload = self.payloads.field(request.response_size)
 
         # create the response message
-        result = f"Hello from {hostname}!   Received your message: {message}"
-        result = {'message': result, 'received': True}
+        result = f"Hello from {hostname} (pid {self.pid})!   Received your message: {message}"
+        result = {'message': result, 'received': True,
+                  'hostname': hostname, 'pid': self.pid, 'request_count': next(self.request_counter)}
 
-        # Print to console
-        logger.log(f"Processed request from {peer_ip} on {hostname}: {message}", color=Fore.GREEN)
+        # Print to console, if this request is sampled
+        if logger.should_log_request():
+            logger.log(f"Processed request from {peer_ip} on {hostname} (pid {self.pid}): {message}", color=Fore.GREEN)
 
-        # Send it
-        return pb2.MessageResponse(**result)
+        # Send it, the payload goes on the end already serialized
+        return pb2.MessageResponse(**result).SerializeToString() + payload
     
 
     def _get_server_identity(self, request_context: Any):
         hostname = socket.gethostname()
-        peer_info = request_context.peer()  # e.g., 'ipv4:127.0.0.1:12345'
-        server_ip = peer_info.split(":")[1] if "ipv4" in peer_info else "unknown" # Extract IP from gRPC peer string
-        return hostname, server_ip
+        return hostname, peer_ip(request_context.peer())
+
+
+class AsyncUnaryService(UnaryService):
+    # Building the response never blocks, so the coroutine can share the sync implementation
+
+    async def GetServerResponse(self, request:Any, context:Any):
+        try:
+            return self._build_response(request, context)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+
+class ServerStreamingService(pb2_grpc_sstream.ServerStreamingServicer):
+    # Every message is a small serialized header with a cached payload field appended, like the unary responses
+
+    def __init__(self, max_payload:int = DEFAULT_MESSAGE_LIMIT, compressibility:float = 0.0):
+        self.payloads = PayloadCache(lambda data: sstream.StreamMessage(payload=data).SerializeToString(), max_payload,
+                                     compressibility=compressibility)
+        self.identity = ((BACKEND_METADATA_KEY, f"{socket.gethostname()}:{os.getpid()}"),)
+
+    def GetServerResponse(self, request:Any, context:Any):
+        context.send_initial_metadata(self.identity)
+        try:
+            field = self.payloads.field(request.response_size)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        for seq in range(request.count):
+            yield sstream.StreamMessage(seq=seq).SerializeToString() + field
+
+
+class AsyncServerStreamingService(ServerStreamingService):
+
+    async def GetServerResponse(self, request:Any, context:Any):
+        await context.send_initial_metadata(self.identity)
+        try:
+            field = self.payloads.field(request.response_size)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        for seq in range(request.count):
+            yield sstream.StreamMessage(seq=seq).SerializeToString() + field
+
+
+class ClientStreamingService(pb2_grpc_cstream.ClientStreamingServicer):
+    # Uploaded messages arrive as raw bytes and are only counted, never parsed
+
+    def __init__(self):
+        self.hostname = socket.gethostname()
+        self.pid = os.getpid()
+        self.request_counter = itertools.count(1)
+
+    def GetServerResponse(self, request_iterator:Any, context:Any):
+        start, first, messages, received = time.perf_counter(), None, 0, 0
+        for raw in request_iterator:
+            if first is None:
+                first = time.perf_counter()
+            messages += 1
+            received += len(raw)
+        return self._summary(start, first, messages, received)
+
+    def _summary(self, start:float, first:float, messages:int, received:int) -> bytes:
+        end = time.perf_counter()
+        first = end if first is None else first
+        return cstream.StreamSummary(messages=messages, bytes_received=received, first_message_us=int((first - start) * 1e6),
+                                     transfer_us=int((end - first) * 1e6), hostname=self.hostname, pid=self.pid,
+                                     request_count=next(self.request_counter)).SerializeToString()
+
+
+class AsyncClientStreamingService(ClientStreamingService):
+
+    async def GetServerResponse(self, request_iterator:Any, context:Any):
+        start, first, messages, received = time.perf_counter(), None, 0, 0
+        async for raw in request_iterator:
+            if first is None:
+                first = time.perf_counter()
+            messages += 1
+            received += len(raw)
+        return self._summary(start, first, messages, received)
+
+
+# Full service name of each --type, which the health service reports on
+SERVICE_NAMES = {"unary": "unary.Unary", "bidirectional": "bidirectional.Bidirectional",
+                 "server-streaming": "serverstreaming.ServerStreaming", "client-streaming": "clientstreaming.ClientStreaming"}
 
 
 def get_cert_and_key() -> tuple[bytes, bytes]:
@@ -68,26 +211,91 @@ def get_cert_and_key() -> tuple[bytes, bytes]:
     return private_key, certificate_chain
 
 
-def main():
-    # Get the config, get some arguments, and create the server   
-    sc = ServerConfig( argparse.ArgumentParser(description="gRPC Server"), logger )
-    ip, port, type = sc.get_args()
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+def add_handlers(server:Any, service:str, handlers:dict[str, grpc.RpcMethodHandler]):
+    # Same registration as the generated add_*Servicer_to_server functions
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(service, handlers),))
+    server.add_registered_method_handlers(service, handlers)
+
 
-    # Create the correct service on the server
+def add_service(server:Any, type:str, engine:str, max_payload:int, metrics:ServerMetrics = None, faults:FaultInjector = None,
+                compressibility:float = 0.0):
+    # Create the correct service on the server.  The handlers are registered without a response
+    # serializer because the services return pre-serialized bytes.  Injected faults wrap them first,
+    # then metrics, so injected delays and errors are counted like real ones.  The handler timing sent
+    # back in the trailing metadata wraps both, so the server time clients see includes them.
+    aio = engine == "aio"
     if type == "unary":
-        logger.info("Starting Unary gRPC Server...")
-        pb2_grpc.add_UnaryServicer_to_server(UnaryService(), server)
+        logger.info(f"Starting Unary gRPC Server ({engine} engine)...")
+        servicer = AsyncUnaryService(max_payload, compressibility) if aio else UnaryService(max_payload, compressibility)
+        behavior, deserializer = servicer.GetServerResponse, pb2.Message.FromString
+        if faults is not None:
+            behavior = faults.instrument_unary(behavior, aio)
+        if metrics is not None:
+            behavior, deserializer = metrics.instrument_unary("unary.Unary/GetServerResponse", behavior, deserializer, aio)
+        behavior = time_unary(behavior, aio)
+        add_handlers(server, SERVICE_NAMES[type], {
+            "GetServerResponse": grpc.unary_unary_rpc_method_handler(behavior, request_deserializer=deserializer),
+        })
 
     elif type == "bidirectional":
-        logger.info("Starting Bidirectional gRPC Server...")
-        pb2_grpc_bidir.add_BidirectionalServicer_to_server(BidirectionalService(), server)
+        logger.info(f"Starting Bidirectional gRPC Server ({engine} engine)...")
+        servicer = AsyncBidirectionalService(max_payload, compressibility) if aio else BidirectionalService(max_payload, compressibility)
+        behavior = servicer.GetServerResponse
+        if faults is not None:
+            behavior = faults.instrument_stream(behavior, aio)
+        if metrics is not None:
+            behavior = metrics.instrument_stream("bidirectional.Bidirectional/GetServerResponse", behavior, aio)
+        behavior = time_stream(behavior, aio)
+        add_handlers(server, SERVICE_NAMES[type], {
+            "GetServerResponse": grpc.stream_stream_rpc_method_handler(behavior),
+        })
+
+    elif type == "server-streaming":
+        logger.info(f"Starting Server Streaming gRPC Server ({engine} engine)...")
+        servicer = AsyncServerStreamingService(max_payload, compressibility) if aio else ServerStreamingService(max_payload, compressibility)
+        behavior, deserializer = servicer.GetServerResponse, sstream.StreamRequest.FromString
+        if faults is not None:
+            behavior = faults.instrument_stream(behavior, aio)
+        if metrics is not None:
+            behavior = metrics.instrument_stream("serverstreaming.ServerStreaming/GetServerResponse", behavior, aio, request_stream=False)
+            deserializer = metrics.count_in(deserializer)
+        behavior = time_stream(behavior, aio, request_stream=False)
+        add_handlers(server, SERVICE_NAMES[type], {
+            "GetServerResponse": grpc.unary_stream_rpc_method_handler(behavior, request_deserializer=deserializer),
+        })
+
+    elif type == "client-streaming":
+        logger.info(f"Starting Client Streaming gRPC Server ({engine} engine)...")
+        servicer = AsyncClientStreamingService() if aio else ClientStreamingService()
+        behavior, deserializer = servicer.GetServerResponse, None
+        if faults is not None:
+            behavior = faults.instrument_unary(behavior, aio)
+        if metrics is not None:
+            behavior, deserializer = metrics.instrument_unary("clientstreaming.ClientStreaming/GetServerResponse", behavior,
+                                                              lambda raw: raw, aio, stream=True)
+        behavior = time_unary(behavior, aio, request_stream=True)
+        add_handlers(server, SERVICE_NAMES[type], {
+            "GetServerResponse": grpc.stream_unary_rpc_method_handler(behavior, request_deserializer=deserializer),
+        })
 
     else:
-        raise ValueError("Invalid service type. Choose 'unary' or 'bidirectional'.")
+        raise ValueError("Invalid service type. Choose 'unary', 'bidirectional', 'server-streaming' or 'client-streaming'.")
+
+    return SERVICE_NAMES[type]
+
 
+def add_health(server:Any, aio:bool) -> Any:
+    # Standard grpc.health.v1 service for the Big-IP's monitor.  The server as a whole ("") starts out
+    # SERVING, the caller sets the service SERVING too, and both go NOT_SERVING when the server drains
+    # or shuts down.
+    servicer = health.aio.HealthServicer() if aio else health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+    return servicer
+
+
+def add_port(server:Any, ip:str, port:int, secure:bool):
     # Bind to address and port - use env vars, cmd args or defaults
-    if sc.args.secure:
+    if secure:
         # Get key and certificate
         private_key, certificate_chain = get_cert_and_key() 
 
@@ -101,22 +309,187 @@ def main():
     else:
         server.add_insecure_port(f"{ip}:{port}")
         logger.info(f"Created insecure server on {ip}:{port}...")
+
+
+def serve_threaded(sc:ServerConfig, options:list[tuple[str, Any]], metrics:ServerMetrics = None, faults:FaultInjector = None):
+    # Every unary handler and every open stream holds one of the pool's threads, the pool times how long
+    # each rpc waits for one
+    server = grpc.server(QueueTimingExecutor(max_workers=sc.args.max_workers), options=options,
+                         compression=COMPRESSION[sc.args.compression])
+    service = add_service(server, sc.type, "threaded", sc.args.max_message_size - MESSAGE_OVERHEAD, metrics, faults,
+                          sc.args.compressibility)
+    health_servicer = add_health(server, aio=False)
+    health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
+    add_port(server, sc.ip, sc.port, sc.args.secure)
  
     # Start the server
     server.start()
     logger.info("Server started. Listening for requests...")
 
-    # Keep the server running unless ctrl-c is pressed
+    # The drain signal only sets the event, the drain itself runs here on the main thread
+    drain = threading.Event()
+    signal.signal(DRAIN_SIGNAL, lambda signum, frame: drain.set())
+
+    # Keep the server running until ctrl-c is pressed or it is told to drain
     try:
-        server.wait_for_termination()
+        drain.wait()
+        health_servicer.enter_graceful_shutdown()
+        log_drain(sc)
+        time.sleep(sc.args.drain_delay)
     except KeyboardInterrupt:
         logger.info("Server shutting down...")
     finally:
-        server.stop(0)
-        logger.info("Server stopped.")
+        health_servicer.enter_graceful_shutdown()
+        start = time.perf_counter()
+        server.stop(sc.args.grace).wait()
+        logger.info(f"Server stopped, in-flight rpcs finished in {time.perf_counter() - start:.2f}s.")
 
 
-if __name__ == '__main__':
-    main()
+async def serve_aio(sc:ServerConfig, options:list[tuple[str, Any]], metrics:ServerMetrics = None, faults:FaultInjector = None):
+    # Handlers are coroutines on one event loop, so open streams cost a task rather than a thread
+    server = grpc.aio.server(options=options, compression=COMPRESSION[sc.args.compression])
+    service = add_service(server, sc.type, "aio", sc.args.max_message_size - MESSAGE_OVERHEAD, metrics, faults,
+                          sc.args.compressibility)
+    health_servicer = add_health(server, aio=True)
+    await health_servicer.set(service, health_pb2.HealthCheckResponse.SERVING)
+    add_port(server, sc.ip, sc.port, sc.args.secure)
+
+    await server.start()
+    logger.info("Server started. Listening for requests...")
+
+    # Turn ctrl-c into an event rather than letting asyncio.run() cancel this task, a cancelled task
+    # can no longer await the server shutdown.  SIGTERM is how a parent stops its workers.
+    shutdown, drain = asyncio.Event(), asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, shutdown.set)
+    loop.add_signal_handler(DRAIN_SIGNAL, drain.set)
+
+    stopped, drained = asyncio.create_task(shutdown.wait()), asyncio.create_task(drain.wait())
+    await asyncio.wait([stopped, drained], return_when=asyncio.FIRST_COMPLETED)
+    await health_servicer.enter_graceful_shutdown()
+    if not shutdown.is_set():
+        # Keep serving while the monitors notice, unless ctrl-c cuts it short
+        log_drain(sc)
+        await asyncio.wait([stopped], timeout=sc.args.drain_delay)
+    stopped.cancel()
+    drained.cancel()
+
+    logger.info("Server shutting down...")
+    start = time.perf_counter()
+    await server.stop(sc.args.grace)
+    logger.info(f"Server stopped, in-flight rpcs finished in {time.perf_counter() - start:.2f}s.")
+
+
+def log_drain(sc:ServerConfig):
+    logger.log(f"Draining: health is NOT_SERVING, still serving for {sc.args.drain_delay:g}s then giving "
+               f"in-flight rpcs up to {sc.args.grace:g}s to finish", color=Fore.MAGENTA)
+
+
+def start_metrics(sc:ServerConfig, index:int = 0) -> ServerMetrics:
+    # Every worker process has its own counters, so worker N serves them on the metrics port + N
+    if not sc.metrics_port:
+        return None
+
+    port = sc.metrics_port + index
+    metrics = ServerMetrics()
+    metrics.serve_http(sc.ip, port)
+    logger.info(f"Serving Prometheus metrics on http://{sc.ip}:{port}/metrics")
+    return metrics
+
+
+def start_faults(sc:ServerConfig) -> FaultInjector:
+    if not sc.faults:
+        return None
+
+    faults = FaultInjector(sc.faults, logger)
+    if sc.engine != "aio" and faults.profile.kind != "none":
+        logger.warning(f"Injected delays hold a handler thread on the threaded engine, use --engine aio to keep "
+                       f"all {sc.args.max_workers} threads free")
+    return faults
+
+
+def serve(sc:ServerConfig, options:list[tuple[str, Any]] = (), index:int = 0):
+    # Options from the command line go last so they override the defaults
+    options = message_size_options(sc.args.max_message_size) + list(options) + sc.args.grpc_option
+    metrics = start_metrics(sc, index)
+    faults = start_faults(sc)
+    try:
+        if sc.engine == "aio":
+            asyncio.run(serve_aio(sc, options, metrics, faults))
+
+        else:
+            serve_threaded(sc, options, metrics, faults)
+    finally:
+        if metrics is not None:
+            metrics.close()
+        if faults is not None:
+            faults.close()
+
+
+def configure_logging(sc:ServerConfig):
+    # Per-request lines are written from a background thread so handlers never block on the console
+    request_sample = 0 if sc.args.no_request_log else sc.args.log_sample
+    ColorLogger.configure(level=sc.args.log_level, request_sample=request_sample, background=True)
 
 
+def run_worker(sc:ServerConfig, index:int):
+    # The parent owns ctrl-c and forwards it as SIGTERM, so a terminal ctrl-c that reaches the whole
+    # process group doesn't interrupt each worker twice
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    signal.signal(DRAIN_SIGNAL, signal.SIG_IGN)
+    configure_logging(sc)
+
+    logger.name = f"gRPC Server[{index}:{os.getpid()}]"
+    serve(sc, options=[("grpc.so_reuseport", 1)], index=index)
+
+
+def serve_workers(sc:ServerConfig):
+    # Spawn rather than fork: the gRPC runtime must not be initialised before the child starts
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=run_worker, args=(sc, i), name=f"grpc-worker-{i}") for i in range(sc.workers)]
+
+    for worker in workers:
+        worker.start()
+    logger.info(f"Started {len(workers)} server workers sharing {sc.ip}:{sc.port}: {[w.pid for w in workers]}")
+
+    # Pass a drain on to every worker, they each drain their own connections and exit
+    def forward_drain(signum:int, frame:Any):
+        logger.log("Draining server workers...", color=Fore.MAGENTA)
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, DRAIN_SIGNAL)
+    signal.signal(DRAIN_SIGNAL, forward_drain)
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping server workers...")
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join(timeout=sc.args.grace + 10)
+            if worker.is_alive():
+                logger.error(f"Worker {worker.pid} did not exit, killing it")
+                worker.kill()
+        logger.info("All server workers stopped.")
+
+
+def main():
+    # Get the config, get some arguments, and create the server   
+    sc = ServerConfig( argparse.ArgumentParser(description="gRPC Server"), logger )
+    configure_logging(sc)
+
+    if sc.workers > 1:
+        serve_workers(sc)
+
+    else:
+        serve(sc)
+
+
+if __name__ == '__main__':
+    main()
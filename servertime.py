@@ -0,0 +1,129 @@
+import time
+import threading
+from concurrent import futures
+from typing import Any, Callable, Optional
+
+from grpc_api import SERVER_TIME_KEY, QUEUE_TIME_KEY
+
+# Seconds the rpc running on this thread waited for it, set by QueueTimingExecutor
+_queued = threading.local()
+
+
+class QueueTimingExecutor(futures.ThreadPoolExecutor):
+    """
+    The threaded engine's handler pool.  gRPC submits every rpc to it once the call arrives, so the
+    wait for a free thread is the time the rpc sat queued in the server before its handler ran.
+    """
+    def submit(self, fn:Callable, /, *args, **kwargs) -> futures.Future:
+        submitted = time.perf_counter()
+
+        def timed():
+            _queued.seconds = time.perf_counter() - submitted
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _queued.seconds = None
+
+        return super().submit(timed)
+
+
+class TimedRequests:
+    # A request stream that adds up how long the handler spent blocked waiting on the client
+    def __init__(self, requests:Any):
+        self.requests = requests
+        self.waited = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return next(self.requests)
+        finally:
+            self.waited += time.perf_counter() - start
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return await self.requests.__anext__()
+        finally:
+            self.waited += time.perf_counter() - start
+
+
+def trailing_metadata(handler:float, queued:Optional[float]) -> tuple[tuple[str, str], ...]:
+    times = ((SERVER_TIME_KEY, str(int(max(handler, 0.0) * 1e6))),)
+    if queued is not None:
+        times += ((QUEUE_TIME_KEY, str(int(queued * 1e6))),)
+    return times
+
+
+def server_time(metadata:Any) -> Optional[tuple[float, Optional[float]]]:
+    # Client side: (handler seconds, queued seconds or None) from an rpc's trailing metadata
+    times = dict(metadata or ())
+    handler = times.get(SERVER_TIME_KEY)
+    if handler is None:
+        return None
+    queued = times.get(QUEUE_TIME_KEY)
+    return int(handler) / 1e6, int(queued) / 1e6 if queued is not None else None
+
+
+def time_unary(behavior:Callable, aio:bool = False, request_stream:bool = False) -> Callable:
+    """
+    Wrap a handler returning one response to send its processing time in the trailing metadata.  Client
+    streaming handlers pass request_stream=True, and the time they spent waiting for the next message is
+    left out.  Failed rpcs send no times.
+    """
+    def unary(request:Any, context:Any) -> Any:
+        queued, start = getattr(_queued, "seconds", None), time.perf_counter()
+        requests = TimedRequests(request) if request_stream else request
+        response = behavior(requests, context)
+        waited = requests.waited if request_stream else 0.0
+        context.set_trailing_metadata(trailing_metadata(time.perf_counter() - start - waited, queued))
+        return response
+
+    async def unary_aio(request:Any, context:Any) -> Any:
+        start = time.perf_counter()
+        requests = TimedRequests(request) if request_stream else request
+        response = await behavior(requests, context)
+        waited = requests.waited if request_stream else 0.0
+        context.set_trailing_metadata(trailing_metadata(time.perf_counter() - start - waited, None))
+        return response
+
+    return unary_aio if aio else unary
+
+
+def time_stream(behavior:Callable, aio:bool = False, request_stream:bool = True) -> Callable:
+    """
+    Wrap a handler streaming its replies.  Only the time spent producing replies counts, not the time the
+    stream is held by gRPC sending them or by the client not sending the next request.  Server streaming
+    handlers get one request rather than an iterator, pass request_stream=False.
+    """
+    def stream(request_iterator:Any, context:Any):
+        queued, busy = getattr(_queued, "seconds", None), 0.0
+        requests = TimedRequests(request_iterator) if request_stream else request_iterator
+        start = time.perf_counter()
+        for reply in behavior(requests, context):
+            busy += time.perf_counter() - start
+            yield reply
+            start = time.perf_counter()
+        busy += time.perf_counter() - start
+        waited = requests.waited if request_stream else 0.0
+        context.set_trailing_metadata(trailing_metadata(busy - waited, queued))
+
+    async def stream_aio(request_iterator:Any, context:Any):
+        busy = 0.0
+        requests = TimedRequests(request_iterator) if request_stream else request_iterator
+        start = time.perf_counter()
+        async for reply in behavior(requests, context):
+            busy += time.perf_counter() - start
+            yield reply
+            start = time.perf_counter()
+        busy += time.perf_counter() - start
+        waited = requests.waited if request_stream else 0.0
+        context.set_trailing_metadata(trailing_metadata(busy - waited, None))
+
+    return stream_aio if aio else stream
@@ -0,0 +1,414 @@
+import math
+import threading
+from colorama import Fore
+from typing import Any, Callable, Iterable, Optional
+
+from logger import ColorLogger
+from results import ResultLog, TraceLog
+from failover import FailoverDetector
+
+
+class LatencyHistogram:
+    """
+    HDR style log-linear histogram of latencies in microseconds.
+
+    Values below SUB_BUCKETS are counted exactly.  Above that every power of two range is split into
+    SUB_BUCKETS / 2 linear buckets, so any recorded value is off by at most 1/64 (~1.6%).  The bucket array
+    has a fixed size however many values are recorded, and two histograms merge by adding counts.
+    """
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    HALF_BUCKETS = SUB_BUCKETS // 2
+    MAX_SHIFT = 24      # top bucket holds values up to ~2^31us, about 35 minutes
+
+    BUCKET_COUNT = SUB_BUCKETS + MAX_SHIFT * HALF_BUCKETS
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total_us = 0
+        self.min_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def bucket_index(cls, value_us:int) -> int:
+        if value_us < cls.SUB_BUCKETS:
+            return max(value_us, 0)
+
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS
+        if shift > cls.MAX_SHIFT:
+            return cls.BUCKET_COUNT - 1
+
+        return cls.SUB_BUCKETS + (shift - 1) * cls.HALF_BUCKETS + (value_us >> shift) - cls.HALF_BUCKETS
+
+    @classmethod
+    def bucket_upper(cls, index:int) -> int:
+        # Highest value that lands in the bucket, which is what percentiles report
+        if index < cls.SUB_BUCKETS:
+            return index
+
+        shift, top = divmod(index - cls.SUB_BUCKETS, cls.HALF_BUCKETS)
+        shift += 1
+        return ((top + cls.HALF_BUCKETS + 1) << shift) - 1
+
+    def record_us(self, value_us:int):
+        self.counts[self.bucket_index(value_us)] += 1
+        if self.count == 0 or value_us < self.min_us:
+            self.min_us = value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+        self.count += 1
+        self.total_us += value_us
+
+    def record(self, seconds:float):
+        self.record_us(int(seconds * 1_000_000))
+
+    def merge(self, other:"LatencyHistogram"):
+        if other.count == 0:
+            return
+
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+
+        if self.count == 0 or other.min_us < self.min_us:
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+        self.count += other.count
+        self.total_us += other.total_us
+
+    def percentile(self, pct:float) -> int:
+        if self.count == 0:
+            return 0
+
+        # Rank of the wanted value, 1 based, never past the last value
+        rank = max(1, min(self.count, math.ceil(pct / 100.0 * self.count)))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.bucket_upper(i), self.max_us)
+
+        return self.max_us
+
+    def cumulative_counts(self, bounds_us:list[int]) -> list[int]:
+        # Values at or below each of the ascending bounds, to the histogram's precision
+        result, seen = [], 0
+        for i, c in enumerate(self.counts):
+            upper = self.bucket_upper(i)
+            while len(result) < len(bounds_us) and upper > bounds_us[len(result)]:
+                result.append(seen)
+            seen += c
+        return result + [seen] * (len(bounds_us) - len(result))
+
+    @property
+    def mean_us(self) -> float:
+        return self.total_us / self.count if self.count else 0.0
+
+    def summary(self) -> str:
+        if self.count == 0:
+            return "no samples"
+
+        ms = lambda us: f"{us / 1000:.2f}ms"
+        return (f"n={self.count} p50={ms(self.percentile(50))} p90={ms(self.percentile(90))} "
+                f"p99={ms(self.percentile(99))} p99.9={ms(self.percentile(99.9))} max={ms(self.max_us)}")
+
+
+class LatencyRecorder:
+    """
+    Per target latency histograms shared by every client in a run.
+
+    Samples land in an interval histogram per target.  Each report folds the interval into the run
+    totals, so periodic reports show recent latency while memory stays at one pair of histograms per
+    target however long the run is.
+    """
+    def __init__(self, title:str = "Latency"):
+        self.title = title
+        self.lock = threading.Lock()
+        self.interval:dict[str, LatencyHistogram] = {}
+        self.totals:dict[str, LatencyHistogram] = {}
+
+    def record(self, target:str, seconds:float):
+        with self.lock:
+            hist = self.interval.get(target)
+            if hist is None:
+                hist = self.interval[target] = LatencyHistogram()
+            hist.record(seconds)
+
+    def _roll_interval(self) -> dict[str, LatencyHistogram]:
+        with self.lock:
+            interval, self.interval = self.interval, {}
+
+        for target, hist in interval.items():
+            self.totals.setdefault(target, LatencyHistogram()).merge(hist)
+        return interval
+
+    @staticmethod
+    def _overall(hists:Iterable[LatencyHistogram]) -> LatencyHistogram:
+        overall = LatencyHistogram()
+        for hist in hists:
+            overall.merge(hist)
+        return overall
+
+    def merge_interval(self, hists:dict[str, LatencyHistogram]):
+        # Fold in another recorder's interval, e.g. from a client process
+        with self.lock:
+            for target, hist in hists.items():
+                self.interval.setdefault(target, LatencyHistogram()).merge(hist)
+
+    def overall(self) -> LatencyHistogram:
+        # Every target's latency for the run so far merged into one histogram
+        self._roll_interval()
+        return self._overall(self.totals.values())
+
+    def _log(self, log:ColorLogger, title:str, hists:dict[str, LatencyHistogram]):
+        log.log(title, color=Fore.CYAN)
+        if len(hists) > 1:
+            for target in sorted(hists):
+                log.log(f"  {target}: {hists[target].summary()}", color=Fore.CYAN)
+        log.log(f"  overall: {self._overall(hists.values()).summary()}", color=Fore.GREEN)
+
+    def report_interval(self, log:ColorLogger, seconds:float):
+        interval = self._roll_interval()
+        if interval:
+            self._log(log, f"{self.title} over the last {seconds:.0f}s", interval)
+
+    def report(self, log:ColorLogger):
+        self._roll_interval()
+        if self.totals:
+            self._log(log, f"{self.title} for the run", self.totals)
+        else:
+            log.warning("No successful rpcs were timed")
+
+
+class BackendDistribution:
+    """
+    Hit counts per backend (hostname:pid) from unary responses, or streams per backend, kept as an interval
+    and a run total like LatencyRecorder so memory is O(backends).  Skew is measured against a uniform split
+    over the backends that answered; a backend that never answers can't be seen here.
+    """
+    def __init__(self, unit:str = "rpcs"):
+        self.unit = unit
+        self.lock = threading.Lock()
+        self.interval:dict[str, int] = {}
+        self.totals:dict[str, int] = {}
+        self.server_counts:dict[str, int] = {}
+
+    def record(self, backend:str, request_count:int = 0):
+        with self.lock:
+            self.interval[backend] = self.interval.get(backend, 0) + 1
+            if request_count > self.server_counts.get(backend, 0):
+                self.server_counts[backend] = request_count
+
+    def merge_interval(self, counts:dict[str, int], server_counts:dict[str, int]):
+        with self.lock:
+            for backend, hits in counts.items():
+                self.interval[backend] = self.interval.get(backend, 0) + hits
+            for backend, served in server_counts.items():
+                if served > self.server_counts.get(backend, 0):
+                    self.server_counts[backend] = served
+
+    def _roll_interval(self) -> dict[str, int]:
+        with self.lock:
+            interval, self.interval = self.interval, {}
+
+        for backend, hits in interval.items():
+            self.totals[backend] = self.totals.get(backend, 0) + hits
+        return interval
+
+    @staticmethod
+    def skew(counts:Iterable[int]) -> tuple[float, float, int, float]:
+        """
+        Returns (max/min ratio, chi-square against a uniform split, degrees of freedom, p-value).  The
+        p-value uses the Wilson-Hilferty normal approximation, close enough to flag a skewed balancer.
+        """
+        counts = list(counts)
+        total, dof = sum(counts), len(counts) - 1
+        if dof < 1 or total == 0:
+            return 1.0, 0.0, 0, 1.0
+
+        expected = total / len(counts)
+        chi2 = sum((c - expected) ** 2 for c in counts) / expected
+        ratio = max(counts) / min(counts)
+
+        k = 2.0 / (9.0 * dof)
+        z = ((chi2 / dof) ** (1.0 / 3.0) - (1.0 - k)) / math.sqrt(k)
+        return ratio, chi2, dof, 0.5 * math.erfc(z / math.sqrt(2.0))
+
+    def _log(self, log:ColorLogger, title:str, counts:dict[str, int]):
+        total = sum(counts.values())
+        log.log(f"{title}: {total} {self.unit} over {len(counts)} backends", color=Fore.CYAN)
+        for backend in sorted(counts):
+            served = self.server_counts.get(backend, 0)
+            served = f", {served} served in total" if served else ""
+            log.log(f"  {backend}: {counts[backend]} ({100.0 * counts[backend] / total:.1f}%){served}", color=Fore.CYAN)
+
+        ratio, chi2, dof, p = self.skew(counts.values())
+        color = Fore.GREEN if p >= 0.01 else Fore.YELLOW
+        log.log(f"  skew: max/min={ratio:.2f} chi2={chi2:.1f} (dof {dof}, p={p:.3f})", color=color)
+
+    def report_interval(self, log:ColorLogger, seconds:float):
+        interval = self._roll_interval()
+        if interval:
+            self._log(log, f"Backend distribution over the last {seconds:.0f}s", interval)
+
+    def report(self, log:ColorLogger):
+        self._roll_interval()
+        if self.totals:
+            self._log(log, "Backend distribution for the run", self.totals)
+
+
+class RunRecorder:
+    """
+    Everything recorded about the rpcs in a run, shared by every client and load worker.
+
+    snapshot() takes what was recorded since the last snapshot and merge() adds one in, which is how client
+    processes report to the coordinator.  Histograms merge by adding bucket counts, so the combined
+    percentiles are exact rather than averages of each process's percentiles.
+    """
+    def __init__(self):
+        self.latency = LatencyRecorder()
+        self.backends = BackendDistribution()
+        self.lock = threading.Lock()
+        self.errors = 0
+        self._reported_errors = 0
+        self._snapshot_errors = 0
+        # Server and client streaming rpcs: time to their first message, and what they moved after it
+        self.first_message = LatencyRecorder("Time to first message")
+        self.transfer = {"messages": 0, "bytes": 0, "seconds": 0.0}
+        self._snapshot_transfer = dict(self.transfer)
+        # Each rpc's latency split into the server's part (its handler and queue time, from the trailing
+        # metadata) and the rest, which is the network and the proxy
+        self.server_time = LatencyRecorder("Server time")
+        self.network_time = LatencyRecorder("Network and proxy time")
+        self.queue_time = LatencyRecorder("Server queue time")
+        # Optional record of every rpc and outage detection, fed by the load modes
+        self.results:Optional[ResultLog] = None
+        self.failover:Optional[FailoverDetector] = None
+        # Optional trace of every rpc sent, written by the clients as they send
+        self.trace:Optional[TraceLog] = None
+
+    def record(self, target:str, seconds:float, backend:Optional[tuple[str, int]] = None):
+        self.latency.record(target, seconds)
+        if backend is not None:
+            self.backends.record(*backend)
+
+    def record_error(self, count:int = 1):
+        with self.lock:
+            self.errors += count
+
+    def record_transfer(self, target:str, first_message:float, messages:int = 0, size:int = 0, seconds:float = 0.0):
+        self.first_message.record(target, first_message)
+        with self.lock:
+            self.transfer["messages"] += messages
+            self.transfer["bytes"] += size
+            self.transfer["seconds"] += seconds
+
+    def record_server_time(self, target:str, latency:float, handler:float, queued:Optional[float] = None):
+        server = handler + (queued or 0.0)
+        self.server_time.record(target, server)
+        self.network_time.record(target, max(latency - server, 0.0))
+        if queued is not None:
+            self.queue_time.record(target, queued)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            errors, self._snapshot_errors = self.errors - self._snapshot_errors, self.errors
+            transfer = {k: v - self._snapshot_transfer[k] for k, v in self.transfer.items()}
+            self._snapshot_transfer = dict(self.transfer)
+        with self.backends.lock:
+            server_counts = dict(self.backends.server_counts)
+        return {"latency": self.latency._roll_interval(), "backends": self.backends._roll_interval(),
+                "server_counts": server_counts, "errors": errors,
+                "first_message": self.first_message._roll_interval(), "transfer": transfer,
+                "server_time": self.server_time._roll_interval(), "network_time": self.network_time._roll_interval(),
+                "queue_time": self.queue_time._roll_interval()}
+
+    def merge(self, snapshot:dict[str, Any]):
+        self.latency.merge_interval(snapshot["latency"])
+        self.backends.merge_interval(snapshot["backends"], snapshot["server_counts"])
+        self.record_error(snapshot["errors"])
+        self.first_message.merge_interval(snapshot["first_message"])
+        self.server_time.merge_interval(snapshot["server_time"])
+        self.network_time.merge_interval(snapshot["network_time"])
+        self.queue_time.merge_interval(snapshot["queue_time"])
+        with self.lock:
+            for k, v in snapshot["transfer"].items():
+                self.transfer[k] += v
+
+    def report_interval(self, log:ColorLogger, seconds:float):
+        self.latency.report_interval(log, seconds)
+        self.first_message.report_interval(log, seconds)
+        self.server_time.report_interval(log, seconds)
+        self.network_time.report_interval(log, seconds)
+        self.queue_time.report_interval(log, seconds)
+        self.backends.report_interval(log, seconds)
+        with self.lock:
+            errors, self._reported_errors = self.errors - self._reported_errors, self.errors
+        if errors:
+            log.warning(f"{errors} rpcs failed over the last {seconds:.0f}s")
+
+    def report(self, log:ColorLogger):
+        self.latency.report(log)
+        self.report_transfer(log)
+        self.report_server_time(log)
+        self.backends.report(log)
+        if self.errors:
+            log.warning(f"{self.errors} rpcs failed in the run")
+
+    def report_transfer(self, log:ColorLogger):
+        with self.lock:
+            messages, size, seconds = self.transfer["messages"], self.transfer["bytes"], self.transfer["seconds"]
+        if not messages:
+            return
+
+        self.first_message.report(log)
+        sustained = f"{size / seconds / 1e6:.2f} MB/s, {messages / seconds:.0f} msg/s" if seconds > 0 else "n/a"
+        log.log(f"Streamed {messages} messages, {size / 1e6:.1f} MB: sustained {sustained} per stream after its first message",
+                color=Fore.GREEN)
+
+
+    def report_server_time(self, log:ColorLogger):
+        # Only servers that send their handler time in the trailing metadata are split
+        if not self.server_time.overall().count:
+            return
+
+        self.server_time.report(log)
+        self.network_time.report(log)
+        if self.queue_time.overall().count:
+            self.queue_time.report(log)
+
+
+class PeriodicReporter(threading.Thread):
+    """
+    Calls each `callback(interval)` every `interval` seconds on a background thread until stopped.
+    """
+    def __init__(self, interval:float, callback:Callable[[float], None]):
+        super().__init__(name="reporter", daemon=True)
+        self.interval = interval
+        self.callbacks = [callback]
+        self.stop_event = threading.Event()
+
+    def add(self, callback:Callable[[float], None]):
+        self.callbacks.append(callback)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            for callback in list(self.callbacks):
+                callback(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+def start_reporter(interval:float, callback:Callable[[float], None]) -> Optional[PeriodicReporter]:
+    # An interval of 0 turns periodic reporting off
+    if interval <= 0:
+        return None
+
+    reporter = PeriodicReporter(interval, callback)
+    reporter.start()
+    return reporter
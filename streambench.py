@@ -0,0 +1,134 @@
+import time
+import threading
+from colorama import Fore
+from typing import Any, Iterator
+
+from logger import ColorLogger
+from scheduler import ArrivalSchedule, wait_until
+from stats import RunRecorder
+from grpc_api import bidir
+
+
+class StreamCounters:
+    """
+    Running totals for the stream.  Only the response loop writes them, the reporter just reads.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.gaps = 0           # messages skipped over in the echoed sequence
+        self.reordered = 0      # echoes that arrived after a later sequence number
+
+
+class StreamBenchmark:
+    """
+    Streaming throughput over one long-lived bidirectional stream.
+
+    Each message carries a sequence number and its perf_counter_ns send time, both echoed by the server,
+    so round-trip time and gaps/reordering are computed as the echoes arrive without logging each one.
+    Messages go out at `rate` per second (0 sends as fast as the window and HTTP/2 flow control allow),
+    with at most `window` unanswered messages on the stream.  The stream ends after `count` messages or
+    `duration` seconds, whichever comes first (0 disables either limit).
+    """
+    def __init__(self, client:Any, log:ColorLogger, recorder:RunRecorder, rate:float = 0.0, count:int = 0,
+                 duration:float = 10.0, window:int = 8):
+        self.client = client
+        self.log = log
+        self.recorder = recorder
+        self.rate = rate
+        self.count = count
+        self.duration = duration
+        self.window = threading.Semaphore(window)
+        self.stop_event = threading.Event()
+        self.counters = StreamCounters()
+        self.next_seq = 0
+        self.start_time = 0.0
+        self.end_time = 0.0
+        self._last = (0.0, 0, 0)
+
+    def _messages(self) -> Iterator[Any]:
+        # Runs on gRPC's request thread, blocking here is how sends are paced
+        schedule = ArrivalSchedule(self.rate, start=self.start_time) if self.rate > 0 else None
+        end = self.start_time + self.duration if self.duration > 0 else float("inf")
+        payload, response_size = self.client.payload, self.client.response_size
+        seq = 0
+
+        while not self.stop_event.is_set() and (self.count == 0 or seq < self.count):
+            if schedule is not None:
+                when = schedule.next()
+                if when >= end:
+                    break
+                wait_until(when)
+            elif time.perf_counter() >= end:
+                break
+
+            while not self.window.acquire(timeout=0.1):
+                if self.stop_event.is_set():
+                    return
+
+            yield bidir.Message(seq=seq, sent_ns=time.perf_counter_ns(), payload=payload, response_size=response_size)
+            seq += 1
+            self.counters.sent = seq
+            self.counters.bytes_sent += len(payload)
+
+    def _on_echo(self, target:str, message:Any):
+        counters = self.counters
+        rtt_ns = time.perf_counter_ns() - message.sent_ns
+        self.window.release()
+        self.recorder.latency.record(target, rtt_ns / 1e9)
+
+        counters.received += 1
+        counters.bytes_received += len(message.payload)
+        if message.seq == self.next_seq:
+            self.next_seq += 1
+        elif message.seq > self.next_seq:
+            counters.gaps += message.seq - self.next_seq
+            self.next_seq = message.seq + 1
+        else:
+            counters.reordered += 1
+
+    def run(self):
+        self.log.info(f"Starting stream benchmark: {'max' if self.rate <= 0 else f'{self.rate:.0f}'} msg/s, "
+                      f"{self.client.request_size}B out / {self.client.response_size or self.client.request_size}B back")
+        self.start_time = time.perf_counter()
+        self._last = (self.start_time, 0, 0)
+
+        with self.client.stream(self._messages()) as (target, responses):
+            try:
+                for message in responses:
+                    self._on_echo(target, message)
+
+            except KeyboardInterrupt:
+                self.log.log("Stream interrupted by user. Closing the stream...", color=Fore.MAGENTA)
+                self.stop_event.set()
+                responses.cancel()
+
+            except Exception as e:
+                self.log.error(f"Stream to {target} failed: {e}")
+                self.recorder.record_error()
+
+            finally:
+                self.stop_event.set()
+                self.end_time = time.perf_counter()
+
+    def report_interval(self, log:ColorLogger, seconds:float):
+        now, counters = time.perf_counter(), self.counters
+        last_time, last_received, last_bytes = self._last
+        self._last = (now, counters.received, counters.bytes_received)
+
+        elapsed = max(now - last_time, 1e-9)
+        log.log(f"Stream: {(counters.received - last_received) / elapsed:.0f} msg/s, "
+                f"{(counters.bytes_received - last_bytes) / elapsed / 1e6:.2f} MB/s received", color=Fore.CYAN)
+
+    def report(self):
+        counters = self.counters
+        elapsed = max((self.end_time or time.perf_counter()) - self.start_time, 1e-9)
+        lost = counters.sent - counters.received
+        color = Fore.GREEN if counters.gaps == 0 and counters.reordered == 0 and lost == 0 else Fore.YELLOW
+
+        self.log.log(f"Stream sent {counters.sent} and received {counters.received} messages in {elapsed:.2f}s: "
+                     f"{counters.received / elapsed:.0f} msg/s, {counters.bytes_sent / elapsed / 1e6:.2f} MB/s out, "
+                     f"{counters.bytes_received / elapsed / 1e6:.2f} MB/s in", color=color)
+        self.log.log(f"Stream sequence: {counters.gaps} gaps, {counters.reordered} reordered, {lost} unanswered", color=color)
@@ -0,0 +1,118 @@
+import time
+import argparse
+import itertools
+from colorama import Fore
+from typing import Any, Optional
+
+from logger import ColorLogger
+from config import SweepConfig
+from benchmark import BenchmarkServer, Case, build_pool, run_case, host_info, write_json
+from payload import message_limit
+
+# Get logging
+logger = ColorLogger("gRPC Sweep")
+
+
+def combinations(matrix:dict[str, list[Any]]) -> list[dict[str, Any]]:
+    # Every combination of the values, the first option changing slowest
+    return [dict(zip(matrix, values)) for values in itertools.product(*matrix.values())]
+
+
+def describe(settings:dict[str, Any]) -> str:
+    return " ".join(f"{key.removeprefix('grpc.')}={value}" for key, value in settings.items()) or "defaults"
+
+
+def server_arguments(settings:dict[str, Any]) -> list[str]:
+    # engine and workers are BenchmarkServer arguments, everything else is passed through to server.py
+    extra = []
+    for key, value in settings.items():
+        if key == "max_workers":
+            extra += ["--max-workers", str(value)]
+        elif key.startswith("grpc."):
+            extra += ["--grpc-option", f"{key}={value}"]
+    return extra
+
+
+def run_channels(case:Case, args:Any, port:int, limit:int, server_settings:dict[str, Any], channels:list[dict[str, Any]],
+                 server:Optional[BenchmarkServer] = None, host:str = "127.0.0.1") -> list[dict[str, Any]]:
+    """
+    The load profile once per channel combination against one server, each over a new pool so no
+    connection carries over from the last combination.
+    """
+    results = []
+    for channel in channels:
+        result = {"server": server_settings, "channel": channel}
+        results.append(result)
+        if server is not None and not server.running:
+            logger.error(f"Skipping {describe(channel)}: server exited")
+            result["skipped"] = "server exited"
+            continue
+
+        pool = build_pool(args, port, case.secure, limit, list(channel.items()), host)
+        try:
+            if not pool.connect(10.0):
+                logger.error(f"Skipping {describe(channel)}: could not connect")
+                result["skipped"] = "could not connect"
+                continue
+
+            logger.info(f"Running server [{describe(server_settings)}] channel [{describe(channel)}] for {args.duration:.0f}s")
+            result.update(run_case(case, args, pool))
+        finally:
+            pool.close()
+
+    return results
+
+
+def rank(results:list[dict[str, Any]], by:str) -> list[dict[str, Any]]:
+    # Best first, combinations that didn't run go last
+    measured = [r for r in results if "skipped" not in r]
+    key = (lambda r: -r["throughput"]) if by == "throughput" else (lambda r: (r["p99_ms"], -r["throughput"]))
+    return sorted(measured, key=key) + [r for r in results if "skipped" in r]
+
+
+def report(ranked:list[dict[str, Any]]):
+    logger.log(f"  {'#':>3} {'throughput':>12} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}  server / channel", color=Fore.CYAN)
+    for i, r in enumerate(ranked, 1):
+        settings = f"[{describe(r['server'])}] / [{describe(r['channel'])}]"
+        if "skipped" in r:
+            logger.warning(f"  {'-':>3} {'skipped':>12} {'':>9} {'':>9} {'':>7}  {settings}: {r['skipped']}")
+            continue
+        color = Fore.GREEN if i == 1 else Fore.YELLOW if r["errors"] else Fore.WHITE
+        logger.log(f"  {i:>3} {r['throughput']:>12.1f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['errors']:>7}  {settings}", color=color)
+
+
+def main():
+    sc = SweepConfig( argparse.ArgumentParser(description="gRPC server and channel option sweep"), logger )
+    args = sc.get_args()
+
+    case = Case("sweep", args.type, args.secure, args.size)
+    limit = message_limit(args.size)
+    servers, channels = combinations(sc.server), combinations(sc.channel)
+    logger.info(f"Sweeping {len(servers) * len(channels)} combinations of {len(servers)} server and {len(channels)} channel settings")
+
+    results = []
+    try:
+        if args.target:
+            results += run_channels(case, args, args.port, limit, {}, channels, host=args.target)
+        else:
+            # A new server, on its own port, for each server combination
+            for i, settings in enumerate(servers):
+                port = args.port + i
+                engine, workers = settings.get("engine", args.engine), settings.get("workers", args.server_workers)
+                with BenchmarkServer(port, args.type, args.secure, engine, workers, limit, server_arguments(settings)) as server:
+                    results += run_channels(case, args, port, limit, settings, channels, server)
+    except KeyboardInterrupt:
+        logger.log("Sweep interrupted by user. Ranking the combinations that finished...", color=Fore.MAGENTA)
+
+    ranked = rank(results, args.rank)
+    logger.log(f"Ranked by {args.rank}:", color=Fore.CYAN)
+    report(ranked)
+
+    write_json(args.output, {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": host_info(),
+                             "settings": {k: getattr(args, k) for k in ("type", "size", "duration", "warmup", "workers", "inflight", "target")},
+                             "ranked_by": args.rank, "results": ranked})
+    logger.info(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()